@@ -1,19 +1,20 @@
 from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_mail import Mail
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from apscheduler.schedulers.background import BackgroundScheduler
 import os
 from dotenv import load_dotenv
+from app.session import RoutingSQLAlchemy
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Flask extensions
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -22,28 +23,29 @@ mail = Mail()
 csrf = CSRFProtect()
 scheduler = BackgroundScheduler()
 
-def create_app():
+def create_app(config_name=None):
+    from app.config import configs, engine_options
+    from app.utils.database import configure_engine
+    from app.utils.http import fingerprint_static, cache_static
+    from app.utils.templates import configure_bytecode_cache
+    
     app = Flask(__name__)
     
-    # Configuration
-    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'default_secret_key_for_development')
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///blood_donation.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['WTF_CSRF_ENABLED'] = True
-    app.config['WTF_CSRF_SECRET_KEY'] = os.getenv('CSRF_SECRET_KEY', 'default_csrf_key_for_development')
+    # Configuration profile: development, testing or production
+    config_name = config_name or os.getenv('FLASK_CONFIG', 'development')
+    app.config.from_object(configs[config_name])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        app.config['DB_POOL_SIZE'],
+        app.config['DB_MAX_OVERFLOW'],
+        app.config['DB_STATEMENT_TIMEOUT_MS']
+    )
     
-    # Email configuration
-    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
-    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
-    app.config['MAIL_USE_TLS'] = True
-    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
+    configure_bytecode_cache(app)
     
-    # Twilio configuration
-    app.config['TWILIO_ACCOUNT_SID'] = os.getenv('TWILIO_ACCOUNT_SID')
-    app.config['TWILIO_AUTH_TOKEN'] = os.getenv('TWILIO_AUTH_TOKEN')
-    app.config['TWILIO_PHONE_NUMBER'] = os.getenv('TWILIO_PHONE_NUMBER')
+    hops = app.config['TRUSTED_PROXY_HOPS']
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
     
     # Initialize extensions with app
     db.init_app(app)
@@ -53,32 +55,59 @@ def create_app():
     csrf.init_app(app)
     migrate = Migrate(app, db)
     
+    with app.app_context():
+        configure_engine(db.engine, app.config['SQLITE_PRAGMAS'])
+        for bind in app.config['REPLICA_BINDS']:
+            configure_engine(db.get_engine(app, bind=bind), app.config['SQLITE_PRAGMAS'])
+    
     @app.after_request
     def set_csrf_cookie(response):
-        if 'csrf_token' not in request.cookies:
+        # Only pages need a token; static files, JSON and streams skip the signing
+        if 'csrf_token' not in request.cookies and request.endpoint != 'static' and response.mimetype == 'text/html':
             response.set_cookie('csrf_token', generate_csrf())
         return response
     
+    # Content-hashed static URLs that browsers may cache for a year
+    app.url_defaults(fingerprint_static)
+    app.after_request(cache_static)
+    
     # Register blueprints
     from app.routes.auth import auth
     from app.routes.donor import donor
     from app.routes.hospital import hospital
     from app.routes.admin import admin
     from app.routes.main import main
+    from app.routes.events import events
+    from app.routes.api import api
     
     app.register_blueprint(auth, url_prefix='/auth')
     app.register_blueprint(donor, url_prefix='/donor')
     app.register_blueprint(hospital, url_prefix='/hospital')
     app.register_blueprint(admin, url_prefix='/admin')
     app.register_blueprint(main)
+    app.register_blueprint(events, url_prefix='/events')
+    app.register_blueprint(api, url_prefix='/api/v1')
+    
+    # Command line tools
+    from app.cli import register_commands
+    register_commands(app)
+    
+    # Models used only by background jobs, and badge counter and search index ORM hooks
+    from app.models.job import JobState
+    from app.utils import counters
+    from app.utils.search import create_search_tables
     
     # Create database tables
-    with app.app_context():
-        db.create_all()
+    if app.config['AUTO_CREATE_TABLES']:
+        with app.app_context():
+            db.create_all()
+            with db.engine.begin() as connection:
+                create_search_tables(connection)
     
-    # Initialize scheduler for reminders but don't start it in development
-    # We'll enable this later when the application is more stable
-    # from app.utils.scheduler import start_scheduler
-    # start_scheduler(app)
+    # Background jobs are off by default in development; set SCHEDULER_ENABLED=true to run them.
+    # Jobs are stored in the database and take a lock, so every worker may start the scheduler.
+    if app.config['SCHEDULER_ENABLED']:
+        from app.utils.scheduler import start_scheduler
+        start_scheduler(app)
     
     return app
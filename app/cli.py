@@ -0,0 +1,95 @@
+from app import db
+from app.utils.donor_import import import_donors, read_roster, IMPORT_CHUNK_SIZE
+from app.utils.templates import precompile_templates
+from app.utils.counters import reconcile_counters
+from app.utils.donor_summary import reconcile_donor_summaries
+from app.utils.registration import email_collisions, normalize_email
+import click
+import csv
+
+
+def register_commands(app):
+    @app.cli.command('import-donors')
+    @click.argument('roster', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Rows per transaction.')
+    @click.option('--workers', type=int, default=None, help='Hashing processes; defaults to one per core.')
+    @click.option('--credentials', type=click.Path(dir_okay=False, writable=True),
+                  help='Generate temporary passwords for rows without one and write them to this CSV.')
+    def import_donors_command(roster, chunk_size, workers, credentials):
+        """Import a blood-camp donor roster from CSV or XLSX."""
+        with open(roster, 'rb') as stream:
+            result = import_donors(read_roster(stream, roster), chunk_size=chunk_size,
+                                   temporary_passwords=bool(credentials), workers=workers)
+
+        if credentials:
+            with open(credentials, 'w', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(['email', 'temporary_password'])
+                writer.writerows(result.credentials)
+
+        for number, messages in result.errors.items():
+            click.echo(f"Row {number}: {'; '.join(messages)}", err=True)
+        click.echo(f"{result.rows} rows, {result.created} donors created, {result.skipped} skipped "
+                   f"in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s)")
+
+    @app.cli.command('sync-replicas')
+    def sync_replicas_command():
+        """Copy a SQLite primary into the SQLite replica binds, for trying out replica routing locally."""
+        if db.engine.dialect.name != 'sqlite':
+            raise click.ClickException('Only SQLite replicas can be synced here; use the database\'s own replication.')
+
+        for bind in app.config['REPLICA_BINDS']:
+            replica_engine = db.get_engine(app, bind=bind)
+            if replica_engine.dialect.name != 'sqlite':
+                raise click.ClickException(f"Replica {bind} is not a SQLite database.")
+
+            primary, replica = db.engine.raw_connection(), replica_engine.raw_connection()
+            try:
+                primary.connection.backup(replica.connection)
+            finally:
+                replica.close()
+                primary.close()
+            click.echo(f"Copied the primary into {bind} ({replica_engine.url.database})")
+
+    @app.cli.command('precompile-templates')
+    def precompile_templates_command():
+        """Compile every template into TEMPLATE_CACHE_DIR, for workers to load at first use."""
+        cache = app.jinja_options.get('bytecode_cache')
+        if cache is None:
+            raise click.ClickException('TEMPLATE_CACHE_DIR is empty, so there is no cache to fill.')
+
+        compiled, errors, elapsed = precompile_templates(app)
+        for name, message in errors.items():
+            click.echo(f"{name}: {message}", err=True)
+        click.echo(f"Compiled {compiled} templates into {cache.directory} in {elapsed:.2f}s")
+        if errors:
+            raise click.ClickException(f"{len(errors)} templates failed to compile.")
+
+    @app.cli.command('email-collisions')
+    @click.option('--keep', type=int, help='Id of the account to keep signing in with the normalized email.')
+    def email_collisions_command(keep):
+        """List accounts whose emails differ only in case, or pick the one that keeps the email."""
+        collisions = email_collisions()
+        if keep is None:
+            for email, users in collisions.items():
+                click.echo(f"{email}: " + ', '.join(
+                    f"{user.id} {user.email} ({user.role}{', signs in' if user.email == email else ''})" for user in users
+                ))
+            click.echo(f"{len(collisions)} emails shared by more than one account")
+            return
+
+        user = next((user for users in collisions.values() for user in users if user.id == keep), None)
+        if user is None:
+            raise click.ClickException(f"User {keep} does not share an email with another account.")
+        email = normalize_email(user.email)
+        holder = next((other for other in collisions[email] if other.email == email), None)
+        if holder is not None and holder is not user:
+            raise click.ClickException(f"User {holder.id} already signs in as {email}; change its email first.")
+        user.email = email
+        db.session.commit()
+        click.echo(f"User {user.id} now signs in as {user.email}; the other accounts keep their old emails")
+
+    @app.cli.command('reconcile-counters')
+    def reconcile_counters_command():
+        """Repair badge counters and donor summaries that drifted from the rows they count."""
+        click.echo(f"Repaired {reconcile_counters()} badge counters and {reconcile_donor_summaries()} donor summaries")
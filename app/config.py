@@ -0,0 +1,138 @@
+import os
+
+
+def env_flag(name, default):
+    return os.getenv(name, 'true' if default else 'false').lower() == 'true'
+
+
+def engine_options(database_uri, pool_size, max_overflow, statement_timeout_ms):
+    """
+    SQLAlchemy engine options for the given database. Server databases get a
+    bounded, health-checked connection pool and a statement timeout.
+    """
+    if database_uri.startswith('sqlite'):
+        # Lock waits are set with the busy_timeout pragma instead
+        return {}
+
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': 10,  # Fail fast instead of queueing requests behind a drained pool
+        'pool_pre_ping': True,  # Drop connections the server or a proxy closed
+        'pool_recycle': 1800,  # Stay under server and load balancer idle timeouts
+    }
+    if database_uri.startswith('postgresql') and statement_timeout_ms:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout_ms}'}
+    return options
+
+
+class Config:
+    SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret_key_for_development')
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///blood_donation.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    WTF_CSRF_ENABLED = True
+    WTF_CSRF_SECRET_KEY = os.getenv('CSRF_SECRET_KEY', 'default_csrf_key_for_development')
+    SCHEDULER_ENABLED = env_flag('SCHEDULER_ENABLED', False)
+
+    # Create missing tables on boot for development. Deployments apply migrations
+    # (flask db upgrade) and turn this off so workers start without schema checks.
+    AUTO_CREATE_TABLES = env_flag('AUTO_CREATE_TABLES', True)
+
+    # Password hashing cost; existing hashes are upgraded on the next login
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+
+    # Login, password reset and donation request throttling. 'memory' is per
+    # process; 'sqlite:///path' shares the counters between workers on a host.
+    RATELIMIT_ENABLED = env_flag('RATELIMIT_ENABLED', True)
+    RATELIMIT_STORAGE = os.getenv('RATELIMIT_STORAGE', 'memory')
+
+    # Reverse proxies (nginx) in front of the app whose X-Forwarded-For and
+    # X-Forwarded-Proto are trusted, so rate limits key on the real client
+    # address. Only set it when every request passes through that many
+    # proxies; otherwise clients can forge their address.
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+
+    # Connection pool for server databases, sized per worker process
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))
+
+    # Read replicas (comma separated URIs) serving dashboards, history, exports
+    # and analytics. A browser reads from the primary for REPLICA_STICKY_SECONDS
+    # after it writes, so it sees its own changes while replicas catch up.
+    REPLICA_URIS = [uri.strip() for uri in os.getenv('DATABASE_REPLICA_URIS', '').split(',') if uri.strip()]
+    SQLALCHEMY_BINDS = {f'replica{number}': uri for number, uri in enumerate(REPLICA_URIS, 1)}
+    REPLICA_BINDS = list(SQLALCHEMY_BINDS)
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+    # Applied to every new SQLite connection. WAL lets readers run alongside
+    # the single writer, and busy_timeout waits for the write lock. With WAL,
+    # synchronous=normal only syncs at checkpoints: a power loss can drop the
+    # last commits but never corrupts the database.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'busy_timeout': 5000,
+        'synchronous': 'normal',
+        'cache_size': -64000,  # KiB, per connection
+        'mmap_size': 268435456,
+        'temp_store': 'memory',
+    }
+
+    # On SQLite, route approvals and broadcasts through one writer thread that
+    # group-commits them (app/utils/write_queue.py)
+    SQLITE_WRITE_QUEUE = env_flag('SQLITE_WRITE_QUEUE', True)
+
+    # Seconds each worker serves anonymous public pages from its cache of
+    # their rendered HTML (app/utils/http.py); 0 renders them every time
+    PAGE_CACHE_SECONDS = int(os.getenv('PAGE_CACHE_SECONDS', 300))
+
+    # Compiled templates shared by the workers on a host; fill it at deploy
+    # with `flask precompile-templates`. Unset uses Jinja's per-user cache
+    # directory; a directory given must belong to the app's user with mode
+    # 0700 (app/utils/templates.py). Empty to compile in each worker.
+    TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR')
+
+    # Email configuration
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
+    MAIL_USE_TLS = True
+    MAIL_USERNAME = os.getenv('MAIL_USERNAME')
+    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
+
+    # Twilio configuration
+    TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
+    TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
+    TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    PAGE_CACHE_SECONDS = int(os.getenv('PAGE_CACHE_SECONDS', 0))  # show template edits at once
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URI', 'sqlite://')
+    WTF_CSRF_ENABLED = False
+    SCHEDULER_ENABLED = False
+    AUTO_CREATE_TABLES = True
+    BCRYPT_LOG_ROUNDS = 4
+    RATELIMIT_ENABLED = False
+    SQLITE_WRITE_QUEUE = False  # the in-memory database is a single shared connection
+
+
+class ProductionConfig(Config):
+    AUTO_CREATE_TABLES = env_flag('AUTO_CREATE_TABLES', False)
+    SCHEDULER_ENABLED = env_flag('SCHEDULER_ENABLED', True)  # reminders, forecasts and counter repair
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 1))  # deployed behind nginx
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+
+
+configs = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
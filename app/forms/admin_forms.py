@@ -1,17 +1,18 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, IntegerField, SelectField, TextAreaField, HiddenField
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, PasswordField, SubmitField, IntegerField, SelectField, TextAreaField, BooleanField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError, NumberRange, Regexp
-from app.models.user import User
+from app.utils.registration import find_taken, normalize_email
 
 class CreateAdminForm(FlaskForm):
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    email = StringField('Email', filters=[normalize_email], validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired()])
     confirm_password = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password')])
     submit = SubmitField('Create Admin')
 
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
+        taken_emails, _, _ = find_taken(emails=[email.data])
+        if taken_emails:
             raise ValidationError('That email is already registered. Please choose a different one.')
 
 
@@ -33,3 +34,9 @@ class TestSMSForm(FlaskForm):
     ])
     message = TextAreaField('Message', validators=[DataRequired(), Length(min=5, max=160)])
     submit = SubmitField('Send SMS')
+
+
+class DonorImportForm(FlaskForm):
+    file = FileField('Donor Roster (CSV or XLSX)', validators=[FileRequired(), FileAllowed(['csv', 'xlsx'], 'Upload a CSV or XLSX file.')])
+    temporary_passwords = BooleanField('Generate temporary passwords for donors without one')
+    submit = SubmitField('Import Donors')
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, BooleanField, SelectField, IntegerField, FloatField, TextAreaField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError, NumberRange
-from app.models.user import User
+from app.utils.registration import find_taken, normalize_email
 
 class RegistrationForm(FlaskForm):
     role = SelectField('Register as', choices=[('donor', 'Donor'), ('hospital', 'Hospital')], validators=[DataRequired()])
@@ -9,7 +9,7 @@ class RegistrationForm(FlaskForm):
 
 
 class LoginForm(FlaskForm):
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    email = StringField('Email', filters=[normalize_email], validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired()])
     remember = BooleanField('Remember Me')
     submit = SubmitField('Login')
@@ -17,7 +17,7 @@ class LoginForm(FlaskForm):
 
 class DonorRegistrationForm(FlaskForm):
     name = StringField('Full Name', validators=[DataRequired(), Length(min=2, max=100)])
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    email = StringField('Email', filters=[normalize_email], validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired()])
     confirm_password = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password')])
     age = IntegerField('Age', validators=[DataRequired(), NumberRange(min=16, max=100)])
@@ -33,8 +33,8 @@ class DonorRegistrationForm(FlaskForm):
     submit = SubmitField('Register')
 
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
+        taken_emails, _, _ = find_taken(emails=[email.data])
+        if taken_emails:
             raise ValidationError('That email is already registered. Please choose a different one or login.')
 
     def validate_pincode(self, pincode):
@@ -44,7 +44,7 @@ class DonorRegistrationForm(FlaskForm):
 
 class HospitalRegistrationForm(FlaskForm):
     name = StringField('Hospital Name', validators=[DataRequired(), Length(min=2, max=100)])
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    email = StringField('Email', filters=[normalize_email], validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired()])
     confirm_password = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password')])
     license_number = StringField('License Number', validators=[DataRequired(), Length(min=5, max=50)])
@@ -53,15 +53,21 @@ class HospitalRegistrationForm(FlaskForm):
     pincode = StringField('Pincode', validators=[DataRequired(), Length(min=6, max=6)])
     submit = SubmitField('Register')
 
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError('That email is already registered. Please choose a different one or login.')
-
-    def validate_license_number(self, license_number):
-        hospital = User.query.join(User.hospital_profile).filter_by(license_number=license_number.data).first()
-        if hospital:
-            raise ValidationError('That license number is already registered.')
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+
+        # Check email and license number together in one query
+        taken_emails, taken_licenses, _ = find_taken(
+            emails=[self.email.data] if self.email.data else [],
+            license_numbers=[self.license_number.data] if self.license_number.data else []
+        )
+        if self.email.data in taken_emails:
+            self.email.errors.append('That email is already registered. Please choose a different one or login.')
+            valid = False
+        if self.license_number.data in taken_licenses:
+            self.license_number.errors.append('That license number is already registered.')
+            valid = False
+        return valid
 
     def validate_pincode(self, pincode):
         if not pincode.data.isdigit():
@@ -69,7 +75,7 @@ class HospitalRegistrationForm(FlaskForm):
 
 
 class ResetPasswordRequestForm(FlaskForm):
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    email = StringField('Email', filters=[normalize_email], validators=[DataRequired(), Email()])
     submit = SubmitField('Request Password Reset')
 
 
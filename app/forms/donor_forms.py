@@ -1,13 +1,15 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, IntegerField, FloatField, TextAreaField, SubmitField, SelectField
+from wtforms import StringField, IntegerField, FloatField, TextAreaField, SubmitField, SelectField, HiddenField
 from wtforms.validators import DataRequired, Length, NumberRange, Email, ValidationError
 from flask_login import current_user
 from app.models.user import User
 
 class DonationRequestForm(FlaskForm):
-    hospital_id = SelectField('Select Hospital', coerce=int, validators=[DataRequired()])
+    hospital_id = IntegerField('Select Hospital', validators=[DataRequired(message='Please select a hospital from the list.')])
     units = IntegerField('Units to Donate', validators=[DataRequired(), NumberRange(min=1, max=2)], default=1)
     notes = TextAreaField('Additional Notes', validators=[Length(max=200)])
+    # Generated when the form is rendered, so resubmitting it cannot create a second request
+    idempotency_key = HiddenField(validators=[Length(max=64)])
     submit = SubmitField('Submit Request')
 
 
@@ -1,5 +1,6 @@
 from app import db
 from datetime import datetime, timedelta
+from sqlalchemy import or_
 
 class Donation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,6 +15,15 @@ class Donation(db.Model):
     completion_date = db.Column(db.DateTime, nullable=True)
     cancellation_date = db.Column(db.DateTime, nullable=True)
     notes = db.Column(db.Text, nullable=True)
+    idempotency_key = db.Column(db.String(64), nullable=True)  # From the request form, to ignore resubmissions
+    
+    # A donor may have one pending request per hospital; the partial index
+    # also serves the duplicate check before inserting
+    __table_args__ = (
+        db.Index('uq_donation_pending_donor_hospital', 'donor_id', 'hospital_id', unique=True,
+                 sqlite_where=db.text("status = 'pending'"), postgresql_where=db.text("status = 'pending'")),
+        db.Index('uq_donation_donor_idempotency_key', 'donor_id', 'idempotency_key', unique=True),
+    )
     
     # Relationships - Using back_populates to define bidirectional relationships
     donor = db.relationship('User', foreign_keys=[donor_id], back_populates='donations')
@@ -22,21 +32,38 @@ class Donation(db.Model):
     def __repr__(self):
         return f"Donation('{self.blood_group}', '{self.status}', '{self.request_date}')"
     
+    # Status changes a donation allows: new status -> (statuses it can move from, date column stamped)
+    TRANSITIONS = {
+        'approved': (('pending',), 'approval_date'),
+        'rejected': (('pending',), 'rejection_date'),
+        'completed': (('approved',), 'completion_date'),
+        'cancelled': (('pending',), 'cancellation_date'),
+    }
+    
+    def can_transition(self, status):
+        return self.status in self.TRANSITIONS[status][0]
+    
+    def transition(self, status, at=None):
+        """
+        Move to a new status and stamp its date. Side effects (inventory,
+        notifications, badges) are applied by app.utils.transitions.
+        """
+        if not self.can_transition(status):
+            raise ValueError(f"A {self.status} donation cannot be {status}")
+        self.status = status
+        setattr(self, self.TRANSITIONS[status][1], at or datetime.utcnow())
+    
     def mark_approved(self):
-        self.status = 'approved'
-        self.approval_date = datetime.utcnow()
+        self.transition('approved')
     
     def mark_rejected(self):
-        self.status = 'rejected'
-        self.rejection_date = datetime.utcnow()
+        self.transition('rejected')
     
     def mark_completed(self):
-        self.status = 'completed'
-        self.completion_date = datetime.utcnow()
+        self.transition('completed')
     
     def mark_cancelled(self):
-        self.status = 'cancelled'
-        self.cancellation_date = datetime.utcnow()
+        self.transition('cancelled')
 
 
 class BloodInventory(db.Model):
@@ -52,6 +79,36 @@ class BloodInventory(db.Model):
         return f"BloodInventory('{self.blood_group}', '{self.units} units')"
 
 
+class InventorySnapshot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    hospital_id = db.Column(db.Integer, db.ForeignKey('hospital_profile.id'), nullable=False)
+    blood_group = db.Column(db.String(5), nullable=False)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    taken_on = db.Column(db.Date, nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('hospital_id', 'blood_group', 'taken_on', name='unique_inventory_snapshot'),)
+    
+    def __repr__(self):
+        return f"InventorySnapshot('{self.blood_group}', '{self.units} units', '{self.taken_on}')"
+
+
+class ShortageForecast(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    hospital_id = db.Column(db.Integer, db.ForeignKey('hospital_profile.id'), nullable=False)
+    blood_group = db.Column(db.String(5), nullable=False)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    donation_rate = db.Column(db.Float, nullable=False, default=0.0)  # units received per day
+    consumption_rate = db.Column(db.Float, nullable=False, default=0.0)  # units used per day
+    days_of_supply = db.Column(db.Float, nullable=True)  # None when stock is not being depleted
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_alert_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (db.UniqueConstraint('hospital_id', 'blood_group', name='unique_shortage_forecast'),)
+    
+    def __repr__(self):
+        return f"ShortageForecast('{self.blood_group}', '{self.days_of_supply} days')"
+
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -66,14 +123,98 @@ class Notification(db.Model):
     related_entity_type = db.Column(db.String(50), nullable=True)  # donation, user, etc.
     related_entity_id = db.Column(db.Integer, nullable=True)
     
+    # Serves the per-user notification list, newest first
+    __table_args__ = (
+        db.Index('ix_notification_user_created', 'user_id', 'created_at'),
+    )
+    
     def __repr__(self):
         return f"Notification('{self.title}', '{self.notification_type}', '{self.is_sent}', '{self.created_at}')"
     
+    @classmethod
+    def unread(cls):
+        """
+        Condition matching unread notifications. A missing read flag counts as
+        unread, here and in the badge counters' ORM events.
+        """
+        return or_(cls.is_read == False, cls.is_read.is_(None))
+    
     def mark_as_read(self):
         self.is_read = True
         db.session.commit()
     
+    @classmethod
+    def mark_all_read(cls, user_id, notification_ids=None):
+        """
+        Mark a user's unread notifications as read with a single UPDATE, limited
+        to notification_ids if given. Does not commit; returns the rows changed.
+        """
+        query = cls.query.filter(cls.user_id == user_id, cls.unread())
+        if notification_ids is not None:
+            query = query.filter(cls.id.in_(notification_ids))
+        return query.update({cls.is_read: True}, synchronize_session='evaluate')
+    
     def mark_as_sent(self):
         self.is_sent = True
         self.sent_at = datetime.utcnow()
         db.session.commit()
+
+
+class BadgeCounter(db.Model):
+    """
+    Denormalized count shown in a badge, kept up to date on write.
+    unread_notifications is owned by a user id, pending_donations by a hospital profile id.
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"BadgeCounter('{self.name}', '{self.owner_id}', '{self.value}')"
+
+
+class DonorSummary(db.Model):
+    """
+    A donor's donation totals, kept up to date on write so dashboards do not
+    load the donor's whole history. Owned by the donor's user id.
+    """
+    donor_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_donations = db.Column(db.Integer, nullable=False, default=0)  # Requests in any status
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    total_units = db.Column(db.Integer, nullable=False, default=0)  # Units of completed donations
+    last_donation_date = db.Column(db.DateTime, nullable=True)  # Mirrors DonorProfile.last_donation_date
+    
+    @property
+    def lives_saved(self):
+        # Each donation can save up to 3 lives
+        return self.total_units * 3
+    
+    @property
+    def next_eligible_date(self):
+        if self.last_donation_date is None:
+            return None
+        return self.last_donation_date + timedelta(days=180)
+    
+    def __repr__(self):
+        return f"DonorSummary('{self.donor_id}', '{self.total_donations}', '{self.total_units} units')"
+
+
+class NotificationArchive(db.Model):
+    """
+    Read notifications moved out of the live table by the retention job
+    """
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Original notification id
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    title = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    notification_type = db.Column(db.String(50), nullable=False)
+    delivery_method = db.Column(db.String(20), nullable=False)
+    is_sent = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    related_entity_type = db.Column(db.String(50), nullable=True)
+    related_entity_id = db.Column(db.Integer, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"NotificationArchive('{self.title}', '{self.notification_type}', '{self.created_at}')"
@@ -0,0 +1,25 @@
+from app import db
+
+class JobState(db.Model):
+    """
+    Progress and locking state for a scheduled job, shared by every worker process
+    """
+    name = db.Column(db.String(100), primary_key=True)
+    watermark = db.Column(db.DateTime, nullable=True)  # last timestamp fully processed
+    locked_by = db.Column(db.String(100), nullable=True)  # hostname:pid of the worker holding the lock
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_run_at = db.Column(db.DateTime, nullable=True)
+
+    # Run metrics, durations in seconds
+    run_count = db.Column(db.Integer, nullable=False, default=0)
+    failure_count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration = db.Column(db.Float, nullable=False, default=0.0)
+    last_duration = db.Column(db.Float, nullable=True)
+    last_error = db.Column(db.String(200), nullable=True)
+
+    @property
+    def average_duration(self):
+        return self.total_duration / self.run_count if self.run_count else None
+
+    def __repr__(self):
+        return f"JobState('{self.name}', '{self.watermark}', '{self.locked_by}')"
@@ -1,10 +1,68 @@
 from app import db, login_manager
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from app.utils.cache import TTLCache
+
+# Column snapshots of recently loaded users and their profiles. Entries are
+# keyed by (user id, version); bumping the version on any change makes older
+# entries unreachable. The short TTL bounds staleness across worker processes.
+IDENTITY_CACHE_TTL = 30
+_identity_cache = TTLCache(maxsize=4096, ttl=IDENTITY_CACHE_TTL)
+_identity_versions = {}
+
+def _identity_key(user_id):
+    return (user_id, _identity_versions.get(user_id, 0))
+
+
+def invalidate_user(user_id):
+    """
+    Drop the cached identity for a user after their account or profile changes
+    """
+    _identity_versions[user_id] = _identity_versions.get(user_id, 0) + 1
+
+
+def _columns(obj):
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _restore(model, columns):
+    # Rebuild a detached instance that merge() can attach without a SELECT
+    obj = model(**columns)
+    make_transient_to_detached(obj)
+    return obj
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    # Take the key before loading so a concurrent invalidation is not overwritten with stale data
+    key = _identity_key(user_id)
+
+    snapshot = _identity_cache.get(key)
+    if snapshot is not None:
+        user = _restore(User, snapshot['user'])
+        for name, model in (('donor_profile', DonorProfile), ('hospital_profile', HospitalProfile)):
+            profile = _restore(model, snapshot[name]) if snapshot[name] else None
+            set_committed_value(user, name, profile)
+        return db.session.merge(user, load=False)
+
+    # Load the user and both profiles in one joined query
+    user = User.query.options(
+        joinedload(User.donor_profile),
+        joinedload(User.hospital_profile)
+    ).get(user_id)
+
+    if user is not None:
+        _identity_cache.set(key, {
+            'user': _columns(user),
+            'donor_profile': _columns(user.donor_profile) if user.donor_profile else None,
+            'hospital_profile': _columns(user.hospital_profile) if user.hospital_profile else None
+        })
+
+    return user
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -41,7 +99,7 @@ class User(db.Model, UserMixin):
 
 class DonorProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer, nullable=False)
     gender = db.Column(db.String(10), nullable=False)
@@ -50,7 +108,7 @@ class DonorProfile(db.Model):
     phone = db.Column(db.String(15), nullable=False)
     address = db.Column(db.String(200), nullable=False)
     pincode = db.Column(db.String(6), nullable=False)
-    last_donation_date = db.Column(db.DateTime, nullable=True)
+    last_donation_date = db.Column(db.DateTime, nullable=True, index=True)
     
     # Notification preferences
     email_notifications = db.Column(db.Boolean, default=True)
@@ -80,7 +138,7 @@ class DonorProfile(db.Model):
 
 class HospitalProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     license_number = db.Column(db.String(50), nullable=False)
     phone = db.Column(db.String(15), nullable=False)
@@ -97,3 +155,36 @@ class HospitalProfile(db.Model):
     
     def __repr__(self):
         return f"HospitalProfile('{self.name}', '{self.license_number}')"
+
+
+def _invalidate_after_commit(target, user_id):
+    # Bumping at flush would let another request cache the still-committed
+    # row under the new version, so the bump waits for the commit
+    inspect(target).session.info.setdefault('invalidated_users', set()).add(user_id)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    _invalidate_after_commit(target, target.id)
+
+
+@event.listens_for(DonorProfile, 'after_insert')
+@event.listens_for(DonorProfile, 'after_update')
+@event.listens_for(DonorProfile, 'after_delete')
+@event.listens_for(HospitalProfile, 'after_insert')
+@event.listens_for(HospitalProfile, 'after_update')
+@event.listens_for(HospitalProfile, 'after_delete')
+def _invalidate_profile(mapper, connection, target):
+    _invalidate_after_commit(target, target.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    for user_id in session.info.pop('invalidated_users', ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('invalidated_users', None)
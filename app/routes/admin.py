@@ -1,16 +1,30 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, current_app, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, current_app, session, Response
 from flask_login import login_required, current_user
 from app import db
+from app.session import read_only
 from app.models.user import User, DonorProfile, HospitalProfile
 from app.models.donation import Donation, BloodInventory, Notification
-from app.forms.admin_forms import CreateAdminForm, ManualStockAdjustmentForm, TestSMSForm
+from app.models.job import JobState
+from app.forms.admin_forms import CreateAdminForm, ManualStockAdjustmentForm, TestSMSForm, DonorImportForm
 from app.utils.sms import send_sms
+from app.utils.inventory import inventory_matrix, BLOOD_GROUPS, LOW_STOCK_THRESHOLD, MATRIX_SORTS
+from app.utils.registration import DONOR_IMPORT_FIELDS
+from app.utils.donor_import import import_donors as import_roster, read_roster
+from app.utils.search import search_ids, typeahead
 from datetime import datetime, timedelta
 from sqlalchemy import func
+import csv
+import io
+import itertools
 import os
 
 admin = Blueprint('admin', __name__)
 
+# Uploads are imported inside the request, hashing passwords in the worker
+# itself, so they must finish well within the gunicorn timeout. Larger
+# rosters go through `flask import-donors`.
+WEB_IMPORT_MAX_ROWS = 200
+
 # Admin access decorator
 def admin_required(f):
     def decorated_function(*args, **kwargs):
@@ -23,6 +37,7 @@ def admin_required(f):
 @admin.route('/dashboard')
 @login_required
 @admin_required
+@read_only
 def dashboard():
     # Get counts for dashboard
     donor_count = User.query.filter_by(role='donor').count()
@@ -74,11 +89,71 @@ def dashboard():
 @admin_required
 def manage_donors():
     page = request.args.get('page', 1, type=int)
-    donors = User.query.filter_by(role='donor').join(DonorProfile).paginate(page=page, per_page=15)
+    search = request.args.get('q', '').strip()
+    query = User.query.filter_by(role='donor').join(DonorProfile)
+    
+    matching = search_ids('donor', search)
+    if matching is not None:
+        query = query.filter(User.id.in_(matching))
+    donors = query.paginate(page=page, per_page=15)
     
     return render_template('admin/donors.html',
                           title='Manage Donors',
-                          donors=donors)
+                          donors=donors,
+                          current_search=search)
+
+
+@admin.route('/users/donors/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_donors():
+    form = DonorImportForm()
+    result = None
+    
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            rows = read_roster(upload.stream, upload.filename)
+            first = next(rows, None)
+            missing = [field for field in DONOR_IMPORT_FIELDS if field not in [
+                name.strip().lower() for name in (first or {}).keys() if name
+            ]]
+            if first is None:
+                flash('The roster has no donor rows.', 'warning')
+            elif missing:
+                flash(f"The file is missing columns: {', '.join(missing)}", 'danger')
+            else:
+                rows = list(itertools.islice(itertools.chain([first], rows), WEB_IMPORT_MAX_ROWS + 1))
+                if len(rows) > WEB_IMPORT_MAX_ROWS:
+                    flash(f'Rosters over {WEB_IMPORT_MAX_ROWS} rows must be imported with the '
+                          f'import-donors command.', 'danger')
+                else:
+                    result = import_roster(rows, temporary_passwords=form.temporary_passwords.data, workers=1)
+                    flash(f'{result.created} donors imported, {result.skipped} rows skipped '
+                          f'({result.rows_per_second:.0f} rows/s).', 'success' if result.created else 'warning')
+                    
+                    # Temporary passwords are only ever shown once, as a download
+                    if result.credentials:
+                        output = io.StringIO()
+                        writer = csv.writer(output)
+                        writer.writerow(['email', 'temporary_password'])
+                        writer.writerows(result.credentials)
+                        return Response(output.getvalue(), mimetype='text/csv', headers={
+                            'Content-Disposition': 'attachment; filename=donor_credentials.csv'
+                        })
+        except (UnicodeDecodeError, ValueError) as e:
+            flash(f'Could not read the roster: {str(e)}', 'danger')
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error importing donors: {str(e)}")
+            flash('An error occurred while importing donors.', 'danger')
+    
+    return render_template('admin/import_donors.html',
+                          title='Import Donors',
+                          form=form,
+                          fields=DONOR_IMPORT_FIELDS,
+                          result=result,
+                          max_rows=WEB_IMPORT_MAX_ROWS)
 
 
 @admin.route('/users/hospitals')
@@ -86,11 +161,29 @@ def manage_donors():
 @admin_required
 def manage_hospitals():
     page = request.args.get('page', 1, type=int)
-    hospitals = User.query.filter_by(role='hospital').join(HospitalProfile).paginate(page=page, per_page=15)
+    search = request.args.get('q', '').strip()
+    query = User.query.filter_by(role='hospital').join(HospitalProfile)
+    
+    matching = search_ids('hospital', search)
+    if matching is not None:
+        query = query.filter(HospitalProfile.id.in_(matching))
+    hospitals = query.paginate(page=page, per_page=15)
     
     return render_template('admin/hospitals.html',
                           title='Manage Hospitals',
-                          hospitals=hospitals)
+                          hospitals=hospitals,
+                          current_search=search)
+
+
+@admin.route('/search')
+@login_required
+@admin_required
+@read_only
+def search_typeahead():
+    kind = request.args.get('kind', 'donor')
+    if kind not in ('donor', 'hospital'):
+        abort(400)
+    return jsonify(results=typeahead(kind, request.args.get('q', '')))
 
 
 @admin.route('/users/admins')
@@ -112,8 +205,8 @@ def create_admin():
     form = CreateAdminForm()
     
     if form.validate_on_submit():
-        from app import bcrypt
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        from app.utils.passwords import hash_password
+        hashed_password = hash_password(form.password.data)
         
         user = User(
             email=form.email.data,
@@ -159,6 +252,7 @@ def delete_user(user_id):
 @admin.route('/donations')
 @login_required
 @admin_required
+@read_only
 def all_donations():
     page = request.args.get('page', 1, type=int)
     status = request.args.get('status', 'all')
@@ -179,6 +273,7 @@ def all_donations():
 @admin.route('/inventory')
 @login_required
 @admin_required
+@read_only
 def all_inventory():
     hospital_id = request.args.get('hospital_id', type=int)
     
@@ -190,10 +285,46 @@ def all_inventory():
                               hospital=hospital,
                               inventory=inventory)
     
-    hospitals = HospitalProfile.query.all()
+    page = request.args.get('page', 1, type=int)
+    sort = request.args.get('sort', 'shortage')
+    if sort not in MATRIX_SORTS:
+        sort = 'shortage'
+    
+    # Pivot every hospital's stock into one row per hospital with a single query
+    pagination, rows = inventory_matrix(page=page, per_page=20, sort=sort)
+    
     return render_template('admin/all_inventory.html',
                           title='All Blood Inventory',
-                          hospitals=hospitals)
+                          pagination=pagination,
+                          rows=rows,
+                          blood_groups=BLOOD_GROUPS,
+                          low_stock_threshold=LOW_STOCK_THRESHOLD,
+                          current_sort=sort)
+
+
+@admin.route('/inventory/matrix')
+@login_required
+@admin_required
+@read_only
+def inventory_matrix_data():
+    """Return the paginated inventory matrix as JSON"""
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    sort = request.args.get('sort', 'shortage')
+    if sort not in MATRIX_SORTS:
+        sort = 'shortage'
+    
+    pagination, rows = inventory_matrix(page=page, per_page=per_page, sort=sort)
+    
+    return jsonify({
+        'blood_groups': BLOOD_GROUPS,
+        'low_stock_threshold': LOW_STOCK_THRESHOLD,
+        'sort': sort,
+        'page': pagination.page,
+        'pages': pagination.pages,
+        'total': pagination.total,
+        'rows': rows
+    })
 
 
 @admin.route('/inventory/adjust/<int:inventory_id>', methods=['GET', 'POST'])
@@ -236,6 +367,7 @@ def adjust_inventory(inventory_id):
 @admin.route('/analytics')
 @login_required
 @admin_required
+@read_only
 def analytics():
     # Get blood group distribution
     blood_groups = db.session.query(
@@ -343,3 +475,41 @@ def test_sms():
                           twilio_token=twilio_token,
                           twilio_number=twilio_number,
                           sms_history=sms_history)
+
+
+@admin.route('/scheduler/status')
+@login_required
+@admin_required
+def scheduler_status():
+    """Return the current scheduler leader and per-job run metrics"""
+    now = datetime.utcnow()
+    leader = None
+    jobs = []
+    
+    for state in JobState.query.order_by(JobState.name).all():
+        lease_active = state.locked_until is not None and state.locked_until > now
+        
+        if state.name == 'scheduler_leader':
+            leader = {
+                'worker': state.locked_by if lease_active else None,
+                'lease_expires': state.locked_until.isoformat() if lease_active else None
+            }
+            continue
+        
+        jobs.append({
+            'name': state.name,
+            'running_on': state.locked_by if lease_active else None,
+            'watermark': state.watermark.isoformat() if state.watermark else None,
+            'last_run_at': state.last_run_at.isoformat() if state.last_run_at else None,
+            'run_count': state.run_count,
+            'failure_count': state.failure_count,
+            'last_duration': state.last_duration,
+            'average_duration': state.average_duration,
+            'last_error': state.last_error
+        })
+    
+    return jsonify({
+        'enabled': current_app.config.get('SCHEDULER_ENABLED', False),
+        'leader': leader,
+        'jobs': jobs
+    })
@@ -0,0 +1,283 @@
+from flask import Blueprint, jsonify, request, abort, current_app
+from flask_login import current_user, login_user, logout_user
+from app import db, csrf
+from app.session import read_only
+from app.models.user import User, DonorProfile, HospitalProfile
+from app.models.donation import Donation, BloodInventory, Notification
+from app.utils.counters import get_count, UNREAD_NOTIFICATIONS
+from app.utils.http import make_etag, not_modified, set_validators, compress_response
+from app.utils.passwords import verify_and_update
+from app.utils.ratelimit import rate_limit, form_email, count_failure
+from app.utils.registration import normalize_email
+from datetime import date, datetime
+from sqlalchemy import func
+
+api = Blueprint('api', __name__)
+
+# Page size of list endpoints, overridable up to MAX_PER_PAGE with ?per_page=
+PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+DONATION_COLUMNS = (
+    Donation.id, Donation.donor_id, DonorProfile.name.label('donor_name'), Donation.hospital_id,
+    HospitalProfile.name.label('hospital_name'), Donation.blood_group, Donation.units, Donation.status,
+    Donation.request_date, Donation.approval_date, Donation.rejection_date, Donation.completion_date,
+    Donation.cancellation_date, Donation.notes
+)
+DONATION_DATES = (
+    Donation.request_date, Donation.approval_date, Donation.rejection_date, Donation.completion_date,
+    Donation.cancellation_date
+)
+INVENTORY_COLUMNS = (
+    BloodInventory.id, BloodInventory.hospital_id, BloodInventory.blood_group, BloodInventory.units,
+    BloodInventory.last_updated
+)
+NOTIFICATION_COLUMNS = (
+    Notification.id, Notification.title, Notification.message, Notification.notification_type,
+    Notification.is_read, Notification.created_at, Notification.related_entity_type, Notification.related_entity_id
+)
+USER_COLUMNS = (User.id, User.email, User.role, User.phone_number, User.email_verified, User.created_at)
+DONOR_PROFILE_COLUMNS = (
+    DonorProfile.name, DonorProfile.age, DonorProfile.gender, DonorProfile.blood_group, DonorProfile.weight,
+    DonorProfile.phone, DonorProfile.address, DonorProfile.pincode, DonorProfile.last_donation_date,
+    DonorProfile.email_notifications, DonorProfile.sms_notifications, DonorProfile.donation_reminders,
+    DonorProfile.eligibility_alerts
+)
+HOSPITAL_PROFILE_COLUMNS = (
+    HospitalProfile.id, HospitalProfile.name, HospitalProfile.license_number, HospitalProfile.phone,
+    HospitalProfile.address, HospitalProfile.pincode
+)
+
+
+def _serialize(row):
+    """
+    A result row as a dict, with dates in ISO 8601
+    """
+    item = row._asdict()
+    for key, value in item.items():
+        if isinstance(value, (date, datetime)):
+            item[key] = value.isoformat()
+    return item
+
+
+def _latest(*values):
+    present = [value for value in values if value is not None]
+    return max(present) if present else None
+
+
+def _page():
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', PER_PAGE, type=int), MAX_PER_PAGE)
+    if page < 1 or per_page < 1:
+        abort(400)
+    return page, per_page
+
+
+def _paginated(query, page, per_page):
+    # One extra row tells whether there is a next page without counting
+    rows = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+    return {
+        'items': [_serialize(row) for row in rows[:per_page]],
+        'page': page,
+        'per_page': per_page,
+        'next_page': page + 1 if len(rows) > per_page else None,
+    }
+
+
+def _conditional(build, etag, last_modified=None):
+    """
+    Answer 304 when the client's copy matches the validators, which come from
+    cheap aggregate queries, so the body is only queried and serialized when
+    something changed
+    """
+    if not_modified(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    return set_validators(response, etag, last_modified)
+
+
+@api.before_request
+def require_login():
+    # Clients sign in with POST /session and send back its session cookie
+    if request.endpoint == 'api.create_session':
+        return
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'authentication required'}), 401
+
+
+@api.after_request
+def compress(response):
+    return compress_response(response)
+
+
+@api.errorhandler(400)
+@api.errorhandler(403)
+@api.errorhandler(404)
+def api_error(error):
+    return jsonify({'error': error.description}), error.code
+
+
+@api.route('/session', methods=['POST'])
+@csrf.exempt
+@rate_limit('login_ip', limit=20, period=60)
+@rate_limit('login_account', limit=5, period=300, key_func=form_email, failures_only=True)
+def create_session():
+    """Sign in with a JSON body of email, password and optionally remember"""
+    # Exempt from CSRF, which a JSON body already prevents: browsers only send
+    # one cross-site after a CORS preflight this app never answers
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('email') or not data.get('password'):
+        abort(400, 'a JSON body with email and password is required')
+
+    user = User.query.filter_by(email=normalize_email(str(data['email']))).first()
+    if not user or not verify_and_update(user, str(data['password'])):
+        count_failure()
+        return jsonify({'error': 'invalid email or password'}), 401
+
+    # Persist a hash upgraded to the configured cost
+    db.session.commit()
+    login_user(user, remember=bool(data.get('remember')))
+    return jsonify({'id': user.id, 'email': user.email, 'role': user.role})
+
+
+@api.route('/session', methods=['DELETE'])
+@csrf.exempt
+def delete_session():
+    """Sign out"""
+    logout_user()
+    return '', 204
+
+
+def _donation_scope():
+    """
+    Filters limiting donations to the ones the current user may see
+    """
+    if current_user.is_donor():
+        return [Donation.donor_id == current_user.id]
+    if current_user.is_hospital():
+        if not current_user.hospital_profile:
+            abort(403)
+        return [Donation.hospital_id == current_user.hospital_profile.id]
+    if current_user.is_admin():
+        return []
+    abort(403)
+
+
+def _donation_query(filters):
+    return db.session.query(*DONATION_COLUMNS).outerjoin(
+        DonorProfile, DonorProfile.user_id == Donation.donor_id
+    ).outerjoin(
+        HospitalProfile, HospitalProfile.id == Donation.hospital_id
+    ).filter(*filters)
+
+
+@api.route('/donations')
+@read_only
+def donations():
+    """Donations of the current donor or hospital, newest first. Filter with ?status="""
+    filters = _donation_scope()
+    status = request.args.get('status')
+    if status:
+        filters.append(Donation.status == status)
+    page, per_page = _page()
+
+    # Every change to a donation sets one of its dates, and deletions change the count.
+    # Renaming a donor or hospital does not, and shows with the next change to the list.
+    count, *dates = db.session.query(
+        func.count(Donation.id), *(func.max(column) for column in DONATION_DATES)
+    ).filter(*filters).one()
+    last_modified = _latest(*dates)
+    etag = make_etag('donations', current_user.id, status, page, per_page, count, last_modified)
+
+    def build():
+        query = _donation_query(filters).order_by(Donation.request_date.desc(), Donation.id.desc())
+        return _paginated(query, page, per_page)
+
+    return _conditional(build, etag, last_modified)
+
+
+@api.route('/donations/<int:donation_id>')
+@read_only
+def donation(donation_id):
+    row = _donation_query(_donation_scope()).filter(Donation.id == donation_id).first()
+    if row is None:
+        abort(404, 'donation not found')
+
+    last_modified = _latest(row.request_date, row.approval_date, row.rejection_date, row.completion_date,
+                            row.cancellation_date)
+    return _conditional(lambda: _serialize(row), make_etag('donation', tuple(row)), last_modified)
+
+
+@api.route('/inventory')
+@read_only
+def inventory():
+    """Blood stock of the current hospital; admins may pass ?hospital_id= or see every hospital"""
+    if current_user.is_hospital():
+        if not current_user.hospital_profile:
+            abort(403)
+        hospital_id = current_user.hospital_profile.id
+    elif current_user.is_admin():
+        hospital_id = request.args.get('hospital_id', type=int)
+    else:
+        abort(403)
+    filters = [BloodInventory.hospital_id == hospital_id] if hospital_id else []
+
+    # Stock changes always set last_updated, and deletions change the count
+    count, last_modified = db.session.query(
+        func.count(BloodInventory.id), func.max(BloodInventory.last_updated)
+    ).filter(*filters).one()
+    etag = make_etag('inventory', hospital_id, count, last_modified)
+
+    def build():
+        rows = db.session.query(*INVENTORY_COLUMNS).filter(*filters).order_by(
+            BloodInventory.hospital_id, BloodInventory.blood_group
+        ).all()
+        return {'items': [_serialize(row) for row in rows]}
+
+    return _conditional(build, etag, last_modified)
+
+
+@api.route('/notifications')
+@read_only
+def notifications():
+    """The current user's notifications, newest first. Pass ?unread=1 for unread ones only"""
+    filters = [Notification.user_id == current_user.id]
+    unread_only = request.args.get('unread') in ('1', 'true')
+    if unread_only:
+        filters.append(Notification.unread())
+    page, per_page = _page()
+
+    # New notifications move created_at; marking them read moves the unread counter
+    count, last_modified = db.session.query(
+        func.count(Notification.id), func.max(Notification.created_at)
+    ).filter(*filters).one()
+    unread = get_count(UNREAD_NOTIFICATIONS, current_user.id)
+    etag = make_etag('notifications', current_user.id, unread_only, page, per_page, count, last_modified, unread)
+
+    def build():
+        query = db.session.query(*NOTIFICATION_COLUMNS).filter(*filters).order_by(
+            Notification.created_at.desc(), Notification.id.desc()
+        )
+        return dict(_paginated(query, page, per_page), unread=unread)
+
+    # Read state has no timestamp, so only the ETag can tell a client its copy is current
+    return _conditional(build, etag)
+
+
+@api.route('/profile')
+@read_only
+def profile():
+    """The current user with their donor or hospital profile"""
+    user = _serialize(db.session.query(*USER_COLUMNS).filter(User.id == current_user.id).one())
+    if current_user.is_donor():
+        row = db.session.query(*DONOR_PROFILE_COLUMNS).filter(DonorProfile.user_id == current_user.id).first()
+        user['donor_profile'] = _serialize(row) if row else None
+    elif current_user.is_hospital():
+        row = db.session.query(*HOSPITAL_PROFILE_COLUMNS).filter(
+            HospitalProfile.user_id == current_user.id
+        ).first()
+        user['hospital_profile'] = _serialize(row) if row else None
+
+    # Profiles carry no modification time; the body is one or two rows, so tag it by content
+    return _conditional(lambda: user, make_etag('profile', user))
@@ -1,12 +1,15 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, current_user, logout_user, login_required
-from app import db, bcrypt
-from app.models.user import User, DonorProfile, HospitalProfile
+from app import db
+from app.models.user import User
 from app.forms.auth_forms import (
     RegistrationForm, LoginForm, DonorRegistrationForm, 
     HospitalRegistrationForm, ResetPasswordRequestForm, ResetPasswordForm
 )
 from app.utils.email import send_reset_email
+from app.utils.passwords import hash_password, verify_and_update
+from app.utils.ratelimit import rate_limit, form_email, count_failure
+from app.utils.registration import add_account
 
 auth = Blueprint('auth', __name__)
 
@@ -32,23 +35,17 @@ def register_donor():
     
     form = DonorRegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
-        user = User(email=form.email.data, password=hashed_password, role='donor')
-        db.session.add(user)
-        db.session.flush()  # Flush to get the user ID
-        
-        donor_profile = DonorProfile(
-            user_id=user.id,
-            name=form.name.data,
-            age=form.age.data,
-            gender=form.gender.data,
-            blood_group=form.blood_group.data,
-            weight=form.weight.data,
-            phone=form.phone.data,
-            address=form.address.data,
-            pincode=form.pincode.data
-        )
-        db.session.add(donor_profile)
+        hashed_password = hash_password(form.password.data)
+        add_account('donor', form.email.data, hashed_password, {
+            'name': form.name.data,
+            'age': form.age.data,
+            'gender': form.gender.data,
+            'blood_group': form.blood_group.data,
+            'weight': form.weight.data,
+            'phone': form.phone.data,
+            'address': form.address.data,
+            'pincode': form.pincode.data
+        })
         db.session.commit()
         
         flash('Your account has been created! You can now log in.', 'success')
@@ -64,32 +61,16 @@ def register_hospital():
     
     form = HospitalRegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
-        user = User(email=form.email.data, password=hashed_password, role='hospital')
-        db.session.add(user)
-        db.session.flush()  # Flush to get the user ID
-        
-        hospital_profile = HospitalProfile(
-            user_id=user.id,
-            name=form.name.data,
-            license_number=form.license_number.data,
-            phone=form.phone.data,
-            address=form.address.data,
-            pincode=form.pincode.data
-        )
-        db.session.add(hospital_profile)
-        
-        # Commit to get the hospital_profile.id
-        db.session.commit()
-        
-        # Initialize blood inventory for all blood groups
-        from app.models.donation import BloodInventory
-        blood_groups = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
-        for bg in blood_groups:
-            inventory = BloodInventory(hospital_id=hospital_profile.id, blood_group=bg, units=0)
-            db.session.add(inventory)
+        hashed_password = hash_password(form.password.data)
         
-        # Commit the inventory entries
+        # User, profile and an empty inventory for every blood group in one transaction
+        add_account('hospital', form.email.data, hashed_password, {
+            'name': form.name.data,
+            'license_number': form.license_number.data,
+            'phone': form.phone.data,
+            'address': form.address.data,
+            'pincode': form.pincode.data
+        })
         db.session.commit()
         
         flash('Your hospital account has been created! You can now log in.', 'success')
@@ -99,6 +80,8 @@ def register_hospital():
 
 
 @auth.route('/login', methods=['GET', 'POST'])
+@rate_limit('login_ip', limit=20, period=60)
+@rate_limit('login_account', limit=5, period=300, key_func=form_email, failures_only=True)
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.home'))
@@ -106,7 +89,9 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        if user and verify_and_update(user, form.password.data):
+            # Persist a hash upgraded to the configured cost
+            db.session.commit()
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             
@@ -118,6 +103,7 @@ def login():
             elif user.is_admin():
                 return redirect(next_page) if next_page else redirect(url_for('admin.dashboard'))
         else:
+            count_failure()
             flash('Login unsuccessful. Please check email and password.', 'danger')
     
     return render_template('auth/login.html', title='Login', form=form)
@@ -130,6 +116,8 @@ def logout():
 
 
 @auth.route('/reset_password', methods=['GET', 'POST'])
+@rate_limit('reset_ip', limit=5, period=3600)
+@rate_limit('reset_account', limit=3, period=3600, key_func=form_email)
 def reset_request():
     if current_user.is_authenticated:
         return redirect(url_for('main.home'))
@@ -157,7 +145,7 @@ def reset_token(token):
     
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = hash_password(form.password.data)
         user.password = hashed_password
         db.session.commit()
         flash('Your password has been updated! You can now log in.', 'success')
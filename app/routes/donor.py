@@ -1,23 +1,25 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, make_response, current_app, send_file
 import csv
 import tempfile
-from app.utils.notifications import send_notification
+from app.utils.notifications import send_notification, mark_notifications_read
+from app.utils.events import publish_notification_delta, publish_pending_delta
+from app.utils.counters import get_count, UNREAD_NOTIFICATIONS
+from app.utils.ratelimit import rate_limit, current_user_id
+from app.utils.hospital_directory import get_directory
+from app.utils.donor_summary import get_summary
+from app.utils.transitions import transition
 from flask_login import login_required, current_user
+from flask_sqlalchemy import Pagination
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models.user import User, DonorProfile
 from app.models.donation import Donation, Notification
 from app.forms.donor_forms import DonationRequestForm, UpdateProfileForm
 from datetime import datetime, timedelta
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.units import inch, cm
-from reportlab.lib import colors
-from reportlab.platypus import Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import Paragraph
-from reportlab.lib.enums import TA_CENTER
 import os
+import uuid
 
 donor = Blueprint('donor', __name__)
 
@@ -30,37 +32,33 @@ def dashboard():
     # Get donor profile
     donor_profile = current_user.donor_profile
     
-    # Get donation history
-    donations = Donation.query.filter_by(donor_id=current_user.id).order_by(Donation.request_date.desc()).all()
+    # Totals come from the donor's summary; only the latest donations are loaded
+    summary = get_summary(current_user.id)
+    donations = Donation.query.filter_by(donor_id=current_user.id).order_by(
+        Donation.request_date.desc()
+    ).limit(5).all()
     
     # Get notifications
-    notifications = Notification.query.filter_by(
-        user_id=current_user.id, 
-        is_read=False
+    notifications = Notification.query.filter(
+        Notification.user_id == current_user.id,
+        Notification.unread()
     ).order_by(Notification.created_at.desc()).limit(5).all()
     
     # Check eligibility
     is_eligible, eligibility_message = donor_profile.is_eligible()
     
     # Calculate next eligible date
-    next_eligible_date = None
-    if donor_profile.last_donation_date:
-        next_eligible_date = donor_profile.last_donation_date + timedelta(days=180)
+    next_eligible_date = summary.next_eligible_date
+    if next_eligible_date:
         days_remaining = (next_eligible_date - datetime.utcnow()).days
     else:
         days_remaining = 0
     
-    # Calculate all-time donation statistics
-    completed_donations = [d for d in donations if d.status == 'completed']
-    total_donations = len(donations)  # All donations
-    completed_count = len(completed_donations)  # Only completed donations
-    total_units = sum(d.units for d in completed_donations)  # Only count completed donations
-    lives_saved = total_units * 3  # Each donation can save up to 3 lives
-    
     return render_template('donor/dashboard.html', 
                           title='Donor Dashboard',
                           donor=donor_profile,
-                          donations=donations[:5],  # Only show last 5 donations
+                          donations=donations,
+                          has_more_donations=summary.total_donations > len(donations),
                           notifications=notifications,
                           is_eligible=is_eligible,
                           eligibility_message=eligibility_message,
@@ -68,14 +66,15 @@ def dashboard():
                           next_eligible_date=next_eligible_date,
                           days_remaining=days_remaining,
                           # Statistics
-                          total_donations=total_donations,
-                          completed_count=completed_count,
-                          total_units=total_units,
-                          lives_saved=lives_saved)
+                          total_donations=summary.total_donations,
+                          completed_count=summary.completed_count,
+                          total_units=summary.total_units,
+                          lives_saved=summary.lives_saved)
 
 
 @donor.route('/donation/request', methods=['GET', 'POST'])
 @login_required
+@rate_limit('donation_request', limit=5, period=3600, key_func=current_user_id)
 def request_donation():
     if not current_user.is_donor():
         abort(403)
@@ -90,39 +89,72 @@ def request_donation():
     
     form = DonationRequestForm()
     
-    # Populate hospital choices with only matching pincode hospitals
-    from app.models.user import HospitalProfile
-    hospitals = HospitalProfile.query.filter_by(pincode=donor_profile.pincode).all()
-    
-    if not hospitals:
+    # Donors pick a hospital in their pincode through the directory autocomplete
+    directory = get_directory()
+    if not directory.in_pincode(donor_profile.pincode):
         flash('No hospitals found in your pincode area. Please check back later.', 'info')
         return redirect(url_for('donor.dashboard'))
     
-    form.hospital_id.choices = [(h.id, f"{h.name} - {h.address}") for h in hospitals]
-    
     if form.validate_on_submit():
         # Verify hospital pincode again for security
+        from app.models.user import HospitalProfile
         hospital = HospitalProfile.query.get(form.hospital_id.data)
-        if hospital.pincode != donor_profile.pincode:
+        if hospital is None or hospital.pincode != donor_profile.pincode:
             flash('Invalid hospital selection.', 'danger')
             return redirect(url_for('donor.request_donation'))
         
+        # A retried or double-clicked submission carries the key of the first one
+        key = form.idempotency_key.data or request.headers.get('Idempotency-Key')
+        if key and _request_with_key(current_user.id, key):
+            flash('Your donation request has been submitted successfully!', 'success')
+            return redirect(url_for('donor.dashboard'))
+        
+        if _pending_request(current_user.id, hospital.id):
+            flash('You already have a pending donation request at this hospital.', 'info')
+            return redirect(url_for('donor.dashboard'))
+        
         donation = Donation(
             donor_id=current_user.id,
             hospital_id=form.hospital_id.data,
             blood_group=donor_profile.blood_group,
             units=form.units.data,
-            notes=form.notes.data
+            notes=form.notes.data,
+            idempotency_key=key or None
         )
         db.session.add(donation)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent submission got there first
+            db.session.rollback()
+            if key and _request_with_key(current_user.id, key):
+                flash('Your donation request has been submitted successfully!', 'success')
+            else:
+                flash('You already have a pending donation request at this hospital.', 'info')
+            return redirect(url_for('donor.dashboard'))
+        publish_pending_delta(hospital.user_id, 1)
         
         flash('Your donation request has been submitted successfully!', 'success')
         return redirect(url_for('donor.dashboard'))
     
+    if not form.idempotency_key.data:
+        form.idempotency_key.data = uuid.uuid4().hex
+    
     return render_template('donor/request_donation.html', 
                           title='Request Donation',
-                          form=form)
+                          form=form,
+                          selected_hospital=directory.get(form.hospital_id.data))
+
+
+def _request_with_key(donor_id, key):
+    return db.session.query(Donation.id).filter_by(donor_id=donor_id, idempotency_key=key).first() is not None
+
+
+def _pending_request(donor_id, hospital_id):
+    # Matches the partial unique index, so this is an index lookup
+    return db.session.query(Donation.id).filter_by(
+        donor_id=donor_id, hospital_id=hospital_id, status='pending'
+    ).first() is not None
 
 
 @donor.route('/donation/history')
@@ -163,26 +195,34 @@ def donation_history():
         except ValueError:
             flash('Invalid end date format', 'warning')
     
-    # Calculate donation statistics
-    all_donations = query.all()
-    total_donations = len(all_donations)  # All donations
-    completed_donations = [d for d in all_donations if d.status == 'completed']
-    completed_count = len(completed_donations)  # Only completed donations
-    total_units = sum(d.units for d in completed_donations)  # Only count completed donations
+    # Statistics come from the donor's summary, or one aggregate query when filtered
+    if status or hospital_id or start_date or end_date:
+        total_donations, completed_count, total_units = query.with_entities(
+            func.count(Donation.id),
+            func.coalesce(func.sum(case((Donation.status == 'completed', 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Donation.status == 'completed', Donation.units), else_=0)), 0)
+        ).one()
+    else:
+        summary = get_summary(current_user.id)
+        total_donations = summary.total_donations
+        completed_count = summary.completed_count
+        total_units = summary.total_units
     lives_saved = total_units * 3  # Each donation can save up to 3 lives
     
-    # Get all donations with pagination
+    # Get one page of donations; the total above saves paginate's count query
     page = request.args.get('page', 1, type=int)
-    donations = query.order_by(Donation.request_date.desc()).paginate(page=page, per_page=10)
-    
-    # Get all hospitals for the filter dropdown
-    from app.models.user import HospitalProfile
-    hospitals = HospitalProfile.query.all()
+    per_page = 10
+    if page < 1:
+        abort(404)
+    items = query.order_by(Donation.request_date.desc()).limit(per_page).offset((page - 1) * per_page).all()
+    if not items and page != 1:
+        abort(404)
+    donations = Pagination(query, page, per_page, total_donations, items)
     
     return render_template('donor/donation_history.html',
                           title='Donation History',
                           donations=donations,
-                          hospitals=hospitals,
+                          selected_hospital=get_directory().get(hospital_id),
                           total_donations=total_donations,
                           completed_count=completed_count,
                           total_units=total_units,
@@ -191,6 +231,24 @@ def donation_history():
                           timedelta=timedelta)
 
 
+@donor.route('/hospitals/autocomplete')
+@login_required
+def hospital_autocomplete():
+    if not current_user.is_donor() or not current_user.donor_profile:
+        abort(403)
+    
+    # 'pincode' lists the hospitals a donor can request at, 'all' any hospital
+    query = request.args.get('q', '')
+    if request.args.get('scope') == 'all':
+        hospitals = get_directory().search(query)
+    else:
+        hospitals = get_directory().search(query, pincode=current_user.donor_profile.pincode)
+    
+    return jsonify({
+        'results': [{'id': h['id'], 'label': h['name'], 'detail': h['address']} for h in hospitals]
+    })
+
+
 @donor.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
@@ -235,11 +293,8 @@ def notification_count():
     if not current_user.is_donor():
         return jsonify({'count': 0})
     
-    # Count unread notifications
-    unread_count = Notification.query.filter_by(
-        user_id=current_user.id,
-        is_read=False
-    ).count()
+    # Maintained on write, so this is a single primary key lookup
+    unread_count = get_count(UNREAD_NOTIFICATIONS, current_user.id)
     
     return jsonify({'count': unread_count})
 
@@ -353,8 +408,11 @@ def mark_notification_read(notification_id):
     
     try:
         # Mark as read
+        was_unread = not notification.is_read
         notification.is_read = True
         db.session.commit()
+        if was_unread:
+            publish_notification_delta(current_user.id, -1)
         
         # If it's an AJAX request, return JSON response
         if request.is_json:
@@ -377,8 +435,61 @@ def mark_notification_read(notification_id):
         return redirect(url_for('donor.notifications'))
 
 
+@donor.route('/notifications/mark-all-read', methods=['POST'])
+@login_required
+def mark_all_notifications_read():
+    if not current_user.is_donor():
+        if request.is_json:
+            return jsonify({'success': False, 'message': 'Unauthorized access'}), 403
+        abort(403)
+    
+    # An optional list of ids limits the update; otherwise every unread notification is marked
+    notification_ids = None
+    if request.is_json:
+        notification_ids = (request.get_json(silent=True) or {}).get('notification_ids')
+    elif request.form.getlist('notification_ids'):
+        notification_ids = request.form.getlist('notification_ids')
+    
+    if notification_ids is not None:
+        try:
+            notification_ids = [int(notification_id) for notification_id in notification_ids]
+        except (TypeError, ValueError):
+            if request.is_json:
+                return jsonify({'success': False, 'message': 'Invalid notification ids'}), 400
+            flash('Invalid notification selection.', 'danger')
+            return redirect(url_for('donor.notifications'))
+    
+    try:
+        count = mark_notifications_read(current_user.id, notification_ids)
+        
+        if request.is_json:
+            return jsonify({
+                'success': True,
+                'message': f'{count} notifications marked as read',
+                'count': count
+            })
+        
+        flash(f'{count} notifications marked as read', 'success')
+        return redirect(url_for('donor.notifications'))
+    
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error marking notifications as read: {str(e)}")
+        if request.is_json:
+            return jsonify({'success': False, 'message': str(e)}), 500
+        
+        flash('An error occurred while marking notifications as read', 'danger')
+        return redirect(url_for('donor.notifications'))
+
+
 def generate_certificate(donation):
     """Generate a beautiful certificate for a blood donation"""
+    # ReportLab is slow to import, so load it on first use rather than at startup
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.lib import colors
+    
     # Create a PDF certificate
     buffer = io.BytesIO()
     p = canvas.Canvas(buffer, pagesize=A4)
@@ -539,9 +650,9 @@ def cancel_donation(donation_id):
         }), 400
     
     try:
-        # Update donation status
-        donation.status = 'cancelled'
-        donation.cancellation_date = datetime.utcnow()
+        # Update donation status; the transition hooks update the hospital's pending badge
+        transition([donation], 'cancelled')
+        db.session.commit()
         
         # Create notification using the enhanced notification system
         notification_result = send_notification(
@@ -557,8 +668,6 @@ def cancel_donation(donation_id):
         # Log notification result
         if not notification_result['success']:
             current_app.logger.warning(f"Failed to send some notifications: {notification_result}")
-            
-        db.session.commit()
         
         # Log the cancellation
         current_app.logger.info(f'Donation {donation_id} cancelled by user {current_user.id}')
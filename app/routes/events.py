@@ -0,0 +1,70 @@
+from flask import Blueprint, Response, current_app
+from flask_login import login_required, current_user
+from app.utils.counters import get_count, UNREAD_NOTIFICATIONS, PENDING_DONATIONS
+from app.utils.events import broker
+import json
+import queue
+
+events = Blueprint('events', __name__)
+
+# Seconds between rereads of an idle stream's counts, which pick up changes
+# made by other worker processes; a keep-alive comment is sent if none changed
+COUNTS_REFRESH_SECONDS = 15
+
+
+def _format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _badge_counts(user_id, hospital_id):
+    if hospital_id is not None:
+        return {'pending_donations': get_count(PENDING_DONATIONS, hospital_id)}
+    if user_id is not None:
+        return {'notifications': get_count(UNREAD_NOTIFICATIONS, user_id)}
+    return {}
+
+
+@events.route('/stream')
+@login_required
+def stream():
+    """Server-Sent Events stream of badge counts for the current user"""
+    app = current_app._get_current_object()
+    user_id = current_user.id
+    counter_owners = (
+        user_id if current_user.is_donor() else None,
+        current_user.hospital_profile.id if current_user.is_hospital() and current_user.hospital_profile else None
+    )
+    counts = _badge_counts(*counter_owners)
+
+    # Publishers only reach streams in their own process, so events here are
+    # just a cue to reread the counters, which are also reread on an interval.
+    # Either way the browser always gets absolute counts from the database.
+    # The generator runs after the request context is gone, so it opens an
+    # app context (and database session) only for each reread.
+    def generate():
+        nonlocal counts
+        subscriber = broker.subscribe(user_id)
+        try:
+            yield 'retry: 5000\n'
+            yield _format_event('counts', counts)
+            while True:
+                try:
+                    subscriber.get(timeout=COUNTS_REFRESH_SECONDS)
+                    changed_here = True
+                except queue.Empty:
+                    changed_here = False
+
+                with app.app_context():
+                    latest = _badge_counts(*counter_owners)
+                if latest != counts:
+                    counts = latest
+                    yield _format_event('counts', counts)
+                elif not changed_here:
+                    yield ': keep-alive\n\n'
+        finally:
+            broker.unsubscribe(user_id, subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+    })
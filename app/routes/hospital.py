@@ -1,15 +1,20 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, send_file
 from flask_login import login_required, current_user
 from app import db, csrf
-from app.models.user import User, HospitalProfile
-from app.models.donation import Donation, BloodInventory, Notification
+from app.session import read_only
+from app.models.user import HospitalProfile
+from app.models.donation import Donation, BloodInventory, Notification, ShortageForecast
 from app.forms.hospital_forms import BloodRequestForm, UpdateHospitalProfileForm
 from app.utils.sms import send_blood_request_notification
+from app.utils.counters import get_count, PENDING_DONATIONS
+from app.utils.write_queue import run_write
+from app.utils.transitions import bulk_transition
+from app.utils.search import search_ids
 from datetime import datetime, timedelta
 from flask_wtf.csrf import CSRFError
 import csv
 from io import StringIO
-from sqlalchemy import func
+from sqlalchemy import func, or_
 import os
 from flask_mail import Message
 from flask import current_app
@@ -20,6 +25,7 @@ hospital = Blueprint('hospital', __name__)
 
 @hospital.route('/dashboard')
 @login_required
+@read_only
 def dashboard():
     if not current_user.is_hospital():
         abort(403)
@@ -105,45 +111,16 @@ def approve_donation(donation_id):
         flash('CSRF token is missing or invalid. Please try again.', 'danger')
         return redirect(url_for('hospital.pending_donations'))
     
-    # Update donation status
-    donation.status = 'approved'
-    donation.approval_date = datetime.utcnow()
-    
-    # Update donor's last donation date
-    donor = User.query.get(donation.donor_id)
-    donor.donor_profile.last_donation_date = datetime.utcnow()
-    
-    # Update blood inventory
-    inventory = BloodInventory.query.filter_by(
-        hospital_id=hospital_profile.id,
-        blood_group=donation.blood_group
-    ).first()
-    
-    if inventory:
-        inventory.units += donation.units
-    else:
-        # Create new inventory entry if it doesn't exist
-        inventory = BloodInventory(
-            hospital_id=hospital_profile.id,
-            blood_group=donation.blood_group,
-            units=donation.units
-        )
-        db.session.add(inventory)
-    
-    # Create notification for donor
-    notification = Notification(
-        user_id=donation.donor_id,
-        message=f"Your blood donation request has been approved by {hospital_profile.name}. Thank you for saving lives!",
-        notification_type='system'
-    )
-    db.session.add(notification)
-    
     try:
-        db.session.commit()
-        flash('Donation request has been approved successfully!', 'success')
+        outcomes = run_write(bulk_transition, 'approved', [donation.id], hospital_id=hospital_profile.id)
     except Exception as e:
-        db.session.rollback()
         flash(f'Error approving donation: {str(e)}', 'danger')
+        return redirect(url_for('hospital.pending_donations'))
+    
+    if outcomes[donation.id][0] == 'moved':
+        flash('Donation request has been approved successfully!', 'success')
+    else:
+        flash('This donation request has already been processed.', 'warning')
     
     return redirect(url_for('hospital.pending_donations'))
 
@@ -173,29 +150,16 @@ def reject_donation(donation_id):
         flash('CSRF token is missing or invalid. Please try again.', 'danger')
         return redirect(url_for('hospital.pending_donations'))
     
-    # Update donation status
-    donation.status = 'rejected'
-    donation.rejection_date = datetime.utcnow()
-    
-    # Send notification to donor
-    notification = Notification(
-        user_id=donation.donor_id,
-        title='Donation Request Rejected',
-        message=f'Your donation request to {hospital_profile.name} has been rejected.',
-        notification_type='donation_rejected',
-        delivery_method='system',
-        related_entity_type='donation',
-        related_entity_id=donation.id
-    )
-    
-    db.session.add(notification)
-    
     try:
-        db.session.commit()
-        flash('Donation request has been rejected.', 'success')
+        outcomes = run_write(bulk_transition, 'rejected', [donation.id], hospital_id=hospital_profile.id)
     except Exception as e:
-        db.session.rollback()
         flash(f'Error rejecting donation: {str(e)}', 'danger')
+        return redirect(url_for('hospital.pending_donations'))
+    
+    if outcomes[donation.id][0] == 'moved':
+        flash('Donation request has been rejected.', 'success')
+    else:
+        flash('This donation request has already been processed.', 'warning')
     
     return redirect(url_for('hospital.pending_donations'))
 
@@ -225,40 +189,108 @@ def mark_completed(donation_id):
         flash('CSRF token is missing or invalid. Please try again.', 'danger')
         return redirect(url_for('hospital.donation_history'))
     
-    # Update donation status
-    donation.status = 'completed'
-    donation.completion_date = datetime.utcnow()
-    
-    # Update donor's last donation date
-    donor = User.query.get(donation.donor_id)
-    if donor and donor.donor_profile:
-        donor.donor_profile.last_donation_date = datetime.utcnow()
-        # Set next eligible donation date (6 months from now)
-        donor.donor_profile.next_donation_date = datetime.utcnow() + timedelta(days=180)
-    
-    # Send notification to donor
-    notification = Notification(
-        user_id=donation.donor_id,
-        title='Donation Completed',
-        message=f'Your donation at {hospital_profile.name} has been marked as completed. Thank you for your contribution!',
-        notification_type='donation_completed',
-        delivery_method='system',
-        related_entity_type='donation',
-        related_entity_id=donation.id
-    )
-    
-    db.session.add(notification)
-    
     try:
-        db.session.commit()
-        flash('Donation has been marked as completed successfully!', 'success')
+        outcomes = run_write(bulk_transition, 'completed', [donation.id], hospital_id=hospital_profile.id)
     except Exception as e:
-        db.session.rollback()
         flash(f'Error completing donation: {str(e)}', 'danger')
+        return redirect(url_for('hospital.donation_history'))
+    
+    if outcomes[donation.id][0] == 'moved':
+        flash('Donation has been marked as completed successfully!', 'success')
+    else:
+        flash('Only approved donations can be marked as completed.', 'warning')
     
     return redirect(url_for('hospital.donation_history'))
 
 
+# Bulk actions a hospital can take on donations and the status each moves them to
+BULK_ACTIONS = {'approve': 'approved', 'reject': 'rejected', 'complete': 'completed'}
+
+# Donations one bulk request may change
+MAX_BULK_DONATIONS = 500
+
+
+def _bulk_filters(spec):
+    """
+    Conditions for a bulk action applied by filter rather than by ids:
+    blood_group and a requested_from/requested_to range (YYYY-MM-DD)
+    """
+    filters = []
+    if spec.get('blood_group'):
+        filters.append(Donation.blood_group == spec['blood_group'])
+    if spec.get('requested_from'):
+        filters.append(Donation.request_date >= datetime.strptime(spec['requested_from'], '%Y-%m-%d'))
+    if spec.get('requested_to'):
+        filters.append(Donation.request_date < datetime.strptime(spec['requested_to'], '%Y-%m-%d') + timedelta(days=1))
+    return filters
+
+
+@hospital.route('/donations/bulk', methods=['POST'])
+@login_required
+def bulk_update_donations():
+    """
+    Approve, reject or complete many donations in one request, either listed
+    by id or every one matching a filter that the action applies to. Takes
+    the pending list's form or JSON:
+    {"action": ..., "donation_ids": [...]} or {"action": ..., "filter": {...}}
+    """
+    if not current_user.is_hospital():
+        abort(403)
+    
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+    else:
+        # scope=all applies the action to everything it can, e.g. after a camp
+        payload = {'action': request.form.get('action'), 'donation_ids': request.form.getlist('donation_ids')}
+        if request.form.get('scope') == 'all':
+            payload = {'action': payload['action'], 'filter': {}}
+    action = payload.get('action')
+    
+    donation_ids, filters = None, ()
+    try:
+        if isinstance(payload.get('filter'), dict):
+            filters = _bulk_filters(payload['filter'])
+        else:
+            donation_ids = sorted({int(donation_id) for donation_id in payload.get('donation_ids') or []})
+    except (TypeError, ValueError):
+        donation_ids = []
+    
+    if action not in BULK_ACTIONS or donation_ids == [] or len(donation_ids or ()) > MAX_BULK_DONATIONS:
+        message = f'Choose an action and between 1 and {MAX_BULK_DONATIONS} donations, or a valid filter.'
+        if request.is_json:
+            return jsonify({'success': False, 'message': message}), 400
+        flash(message, 'warning')
+        return redirect(url_for('hospital.pending_donations'))
+    
+    try:
+        outcomes = run_write(bulk_transition, BULK_ACTIONS[action], donation_ids,
+                             hospital_id=current_user.hospital_profile.id, filters=filters, limit=MAX_BULK_DONATIONS)
+    except Exception as e:
+        current_app.logger.error(f"Bulk {action} of donations failed: {str(e)}")
+        if request.is_json:
+            return jsonify({'success': False, 'message': 'Error updating donations'}), 500
+        flash(f'Error updating donations: {str(e)}', 'danger')
+        return redirect(url_for('hospital.pending_donations'))
+    
+    updated = sum(1 for outcome, status in outcomes.values() if outcome == 'moved')
+    skipped = len(outcomes) - updated
+    if request.is_json:
+        return jsonify({
+            'success': True,
+            'updated': updated,
+            'skipped': skipped,
+            'results': [{'id': donation_id, 'outcome': outcome, 'status': status}
+                        for donation_id, (outcome, status) in sorted(outcomes.items())]
+        })
+    
+    flash(f'{updated} donation requests {BULK_ACTIONS[action]}.', 'success' if updated else 'info')
+    if skipped:
+        flash(f'{skipped} donation requests had already been processed or were not found and were skipped.', 'warning')
+    if action == 'complete':
+        return redirect(url_for('hospital.donation_history'))
+    return redirect(url_for('hospital.pending_donations'))
+
+
 @hospital.route('/blood/request', methods=['GET', 'POST'])
 @login_required
 def request_blood():
@@ -328,6 +360,12 @@ def inventory():
         flash('Error initializing inventory items.', 'danger')
         current_app.logger.error(f"Error initializing inventory: {str(e)}")
     
+    # Cached shortage forecasts from the nightly job
+    forecasts = {
+        f.blood_group: f
+        for f in ShortageForecast.query.filter_by(hospital_id=hospital_profile.id).all()
+    }
+    
     # Prepare chart data
     chart_data = {
         'blood_groups': blood_groups,
@@ -339,6 +377,7 @@ def inventory():
     return render_template('hospital/inventory.html',
                           title='Blood Inventory',
                           inventory=inventory,
+                          forecasts=forecasts,
                           chart_data=chart_data)
 
 
@@ -394,14 +433,29 @@ def pending_donations_count():
     # Get hospital profile
     hospital_profile = current_user.hospital_profile
     
-    # Count pending donations
-    count = Donation.query.filter_by(hospital_id=hospital_profile.id, status='pending').count()
+    # Maintained on write, so this is a single primary key lookup
+    count = get_count(PENDING_DONATIONS, hospital_profile.id)
     
     return jsonify({'count': count})
 
 
+def _search_donations(query, hospital_id, search):
+    """
+    Narrow a query of the hospital's donations to those whose notes or donor
+    name, email or phone match the search words
+    """
+    matching_donations = search_ids('donation', search, hospital_id=hospital_id)
+    if matching_donations is None:
+        return query
+    return query.filter(or_(
+        Donation.id.in_(matching_donations),
+        Donation.donor_id.in_(search_ids('donor', search))
+    ))
+
+
 @hospital.route('/donations/export-csv')
 @login_required
+@read_only
 def export_donations_csv():
     if not current_user.is_hospital():
         abort(403)
@@ -412,6 +466,7 @@ def export_donations_csv():
     # Get filter parameters
     status = request.args.get('status', 'all')
     blood_group = request.args.get('blood_group', 'all')
+    search = request.args.get('q', '').strip()
     
     # Build query
     query = Donation.query.filter_by(hospital_id=hospital_profile.id)
@@ -420,6 +475,7 @@ def export_donations_csv():
         query = query.filter_by(status=status)
     if blood_group != 'all':
         query = query.filter_by(blood_group=blood_group)
+    query = _search_donations(query, hospital_profile.id, search)
     
     # Order by date
     donations = query.order_by(Donation.request_date.desc()).all()
@@ -461,6 +517,7 @@ def export_donations_csv():
 
 @hospital.route('/donations/statistics')
 @login_required
+@read_only
 def get_donation_statistics():
     if not current_user.is_hospital():
         abort(403)
@@ -513,6 +570,7 @@ def get_donation_statistics():
 
 @hospital.route('/donations/history')
 @login_required
+@read_only
 def donation_history():
     if not current_user.is_hospital():
         abort(403)
@@ -524,6 +582,7 @@ def donation_history():
     page = request.args.get('page', 1, type=int)
     status = request.args.get('status', 'all')
     blood_group = request.args.get('blood_group', 'all')
+    search = request.args.get('q', '').strip()
     
     # Build query
     query = Donation.query.filter_by(hospital_id=hospital_profile.id)
@@ -532,6 +591,7 @@ def donation_history():
         query = query.filter_by(status=status)
     if blood_group != 'all':
         query = query.filter_by(blood_group=blood_group)
+    query = _search_donations(query, hospital_profile.id, search)
     
     # Get total count for pagination
     total = query.count()
@@ -577,6 +637,7 @@ def donation_history():
                           donations=donations,
                           current_status=status,
                           current_blood_group=blood_group,
+                          current_search=search,
                           total_donations=total,
                           stats={
                               'total_donations': total_stats.total_count or 0,
@@ -618,6 +679,7 @@ def profile():
 
 @hospital.route('/inventory/chart-data')
 @login_required
+@read_only
 def inventory_chart_data():
     if not current_user.is_hospital():
         abort(403)
@@ -1,10 +1,12 @@
 from flask import Blueprint, render_template, redirect, url_for
 from flask_login import current_user
+from app.utils.http import cached_page
 
 main = Blueprint('main', __name__)
 
 @main.route('/')
 @main.route('/home')
+@cached_page
 def home():
     if current_user.is_authenticated:
         if current_user.is_donor():
@@ -17,9 +19,11 @@ def home():
     return render_template('main/home.html', title='Home')
 
 @main.route('/about')
+@cached_page
 def about():
     return render_template('main/about.html', title='About')
 
 @main.route('/contact')
+@cached_page
 def contact():
     return render_template('main/contact.html', title='Contact Us')
@@ -0,0 +1,84 @@
+from flask import current_app, g, has_request_context, session as flask_session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from functools import wraps
+from sqlalchemy import event, orm
+import random
+import time
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session that sends the reads of read-only endpoints to a replica.
+
+    Everything else goes to the primary: flushes and bulk statements, any
+    read once the session has written, and the reads of users who committed
+    within the last REPLICA_STICKY_SECONDS, so they see their own writes
+    while the replicas catch up.
+    """
+
+    def __init__(self, db, **options):
+        SignallingSession.__init__(self, db, **options)
+        self.db = db
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replica = g.get('replica_bind') if has_request_context() else None
+        if (replica is None or self._flushing or self.info.get('wrote')
+                or getattr(clause, 'is_dml', False) or _has_bind_key(mapper)):
+            return SignallingSession.get_bind(self, mapper, clause)
+        return self.db.get_engine(self.app, bind=replica)
+
+
+def _has_bind_key(mapper):
+    if mapper is None:
+        return False
+    return getattr(mapper.persist_selectable, 'info', {}).get('bind_key') is not None
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_wrote(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _stick_after_commit(session):
+    if session.info.pop('wrote', False):
+        stick_to_primary()
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_writes(session, previous_transaction):
+    session.info.pop('wrote', None)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def stick_to_primary():
+    """
+    Send this browser's reads to the primary for REPLICA_STICKY_SECONDS
+    """
+    if has_request_context() and current_app.config.get('REPLICA_BINDS'):
+        flask_session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+        g.pop('replica_bind', None)
+
+
+def read_only(f):
+    """
+    Serve the view's reads from a replica bind when replicas are configured,
+    unless this browser wrote recently
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        replicas = current_app.config.get('REPLICA_BINDS')
+        if replicas and flask_session.get('primary_until', 0) < time.time():
+            g.replica_bind = random.choice(replicas)
+        return f(*args, **kwargs)
+    return decorated_function
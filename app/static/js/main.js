@@ -63,32 +63,64 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    // Fetch notification count for donors
+    // Notification and pending request badges
     const notificationBadge = document.querySelector('.notification-badge');
-    if (notificationBadge) {
+    const pendingBadge = document.querySelector('.pending-badge');
+    const badgeCounts = {};
+
+    function renderBadge(badge, count) {
+        badge.textContent = count > 0 ? count : '';
+    }
+
+    function setBadgeCount(name, badge, count) {
+        badgeCounts[name] = Math.max(count, 0);
+        renderBadge(badge, badgeCounts[name]);
+    }
+
+    // Fetch notification count for donors
+    function fetchNotificationCount() {
         fetch('/donor/notifications/count')
             .then(response => response.json())
-            .then(data => {
-                if (data.count > 0) {
-                    notificationBadge.textContent = data.count;
-                }
-            })
+            .then(data => setBadgeCount('notifications', notificationBadge, data.count))
             .catch(error => console.error('Error fetching notifications:', error));
     }
 
     // Fetch pending donation count for hospitals
-    const pendingBadge = document.querySelector('.pending-badge');
-    if (pendingBadge) {
+    function fetchPendingCount() {
         fetch('/hospital/donations/pending/count')
             .then(response => response.json())
-            .then(data => {
-                if (data.count > 0) {
-                    pendingBadge.textContent = data.count;
-                }
-            })
+            .then(data => setBadgeCount('pending_donations', pendingBadge, data.count))
             .catch(error => console.error('Error fetching pending donations:', error));
     }
 
+    function refreshBadges() {
+        if (notificationBadge) fetchNotificationCount();
+        if (pendingBadge) fetchPendingCount();
+    }
+
+    if (notificationBadge || pendingBadge) {
+        if (window.EventSource) {
+            // The server pushes the current counts on connect and whenever they change
+            const badgeStream = new EventSource('/events/stream');
+
+            badgeStream.addEventListener('counts', function(event) {
+                const counts = JSON.parse(event.data);
+                if (notificationBadge && 'notifications' in counts) {
+                    setBadgeCount('notifications', notificationBadge, counts.notifications);
+                }
+                if (pendingBadge && 'pending_donations' in counts) {
+                    setBadgeCount('pending_donations', pendingBadge, counts.pending_donations);
+                }
+            });
+
+            window.addEventListener('beforeunload', function() {
+                badgeStream.close();
+            });
+        } else {
+            refreshBadges();
+        }
+    }
+
     // Eligibility checker on donor dashboard
     const eligibilityChecker = document.getElementById('eligibility-checker');
     if (eligibilityChecker) {
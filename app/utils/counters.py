@@ -0,0 +1,237 @@
+from app import db
+from app.models.user import User, HospitalProfile
+from app.models.donation import Donation, Notification, BadgeCounter
+from collections import Counter
+from sqlalchemy import event, inspect, and_, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+UNREAD_NOTIFICATIONS = 'unread_notifications'  # owned by a user id
+PENDING_DONATIONS = 'pending_donations'  # owned by a hospital profile id
+
+_counters = BadgeCounter.__table__
+_notifications = Notification.__table__
+_donations = Donation.__table__
+
+# INSERT ... ON CONFLICT for the databases the app runs on
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _source_count(connection, name, owner_id):
+    """
+    Count the rows a counter stands for
+    """
+    if name == UNREAD_NOTIFICATIONS:
+        query = select(func.count()).select_from(_notifications).where(and_(
+            _notifications.c.user_id == owner_id,
+            Notification.unread()
+        ))
+    else:
+        query = select(func.count()).select_from(_donations).where(and_(
+            _donations.c.hospital_id == owner_id,
+            _donations.c.status == 'pending'
+        ))
+    return connection.execute(query).scalar()
+
+
+def bump(connection, name, owner_id, delta):
+    """
+    Adjust a counter within the caller's transaction, after the change it
+    counts has been written. A counter with no row yet is seeded from a
+    recount, which already includes that change; if a concurrent transaction
+    seeds it first, the delta is applied to its row instead.
+    """
+    if owner_id is None or not delta:
+        return
+
+    updated = connection.execute(_counters.update().where(and_(
+        _counters.c.name == name,
+        _counters.c.owner_id == owner_id
+    )).values(value=_counters.c.value + delta))
+    if updated.rowcount:
+        return
+
+    insert = _INSERTS[connection.dialect.name](_counters).values(
+        name=name, owner_id=owner_id, value=_source_count(connection, name, owner_id)
+    )
+    connection.execute(insert.on_conflict_do_update(
+        index_elements=[_counters.c.name, _counters.c.owner_id],
+        set_={'value': _counters.c.value + delta}
+    ))
+
+
+def bump_many(name, deltas):
+    """
+    Apply {owner_id: delta} changes in the current session's transaction, for
+    bulk writes that bypass ORM events
+    """
+    connection = db.session.connection()
+    for owner_id, delta in deltas.items():
+        bump(connection, name, owner_id, delta)
+
+
+def get_count(name, owner_id):
+    """
+    Read a counter with a primary key lookup. Reads never write: until the
+    first change creates the counter, its rows are counted instead.
+    """
+    value = db.session.query(BadgeCounter.value).filter_by(name=name, owner_id=owner_id).scalar()
+    if value is None:
+        value = _source_count(db.session.connection(), name, owner_id)
+    return max(value, 0)
+
+
+def reconcile_counters():
+    """
+    Recount every counter from the source tables, repair any drift and seed
+    missing counters. Each repair is a compare-and-set against the value read
+    before recounting, so a counter bumped meanwhile is left for the next run.
+    Returns the number of counters repaired.
+    """
+    stored = {(name, owner_id): value for name, owner_id, value in db.session.query(
+        BadgeCounter.name, BadgeCounter.owner_id, BadgeCounter.value
+    ).all()}
+
+    actual = {}
+    for user_id, count in db.session.query(Notification.user_id, func.count(Notification.id)).filter(
+        Notification.unread()
+    ).group_by(Notification.user_id).all():
+        actual[(UNREAD_NOTIFICATIONS, user_id)] = count
+
+    for hospital_id, count in db.session.query(Donation.hospital_id, func.count(Donation.id)).filter(
+        Donation.status == 'pending',
+        Donation.hospital_id.isnot(None)
+    ).group_by(Donation.hospital_id).all():
+        actual[(PENDING_DONATIONS, hospital_id)] = count
+
+    connection = db.session.connection()
+    corrected = 0
+    for (name, owner_id), seen in stored.items():
+        value = actual.pop((name, owner_id), 0)
+        if seen != value:
+            corrected += connection.execute(_counters.update().where(and_(
+                _counters.c.name == name,
+                _counters.c.owner_id == owner_id,
+                _counters.c.value == seen
+            )).values(value=value)).rowcount
+
+    # Owners whose counter has not been written yet; a writer may seed it meanwhile
+    if actual:
+        insert = _INSERTS[connection.dialect.name](_counters)
+        connection.execute(insert.on_conflict_do_nothing(), [
+            {'name': name, 'owner_id': owner_id, 'value': value} for (name, owner_id), value in actual.items()
+        ])
+
+    db.session.commit()
+    return corrected
+
+
+def _changed(target, attribute):
+    """
+    Return (old, new) for an attribute changed in the current flush, or None
+    """
+    history = inspect(target).attrs[attribute].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _defer(target, name, owner_id, delta):
+    """
+    Collect a change seen by an ORM event. A flush may write a batch of rows
+    in one statement before their events run, so the counters are bumped
+    once the whole flush is written (_apply_deferred), when a recount seeding
+    a missing counter matches the deltas.
+    """
+    if owner_id is None or not delta:
+        return
+    deltas = inspect(target).session.info.setdefault('badge_counter_deltas', Counter())
+    deltas[(name, owner_id)] += delta
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_deferred(session, flush_context):
+    deltas = session.info.pop('badge_counter_deltas', None)
+    if deltas:
+        connection = session.connection()
+        for (name, owner_id), delta in deltas.items():
+            bump(connection, name, owner_id, delta)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_deferred(session, previous_transaction):
+    session.info.pop('badge_counter_deltas', None)
+
+
+@event.listens_for(Notification, 'after_insert')
+def _notification_inserted(mapper, connection, target):
+    if not target.is_read:
+        _defer(target, UNREAD_NOTIFICATIONS, target.user_id, 1)
+
+
+@event.listens_for(Notification, 'after_update')
+def _notification_updated(mapper, connection, target):
+    change = _changed(target, 'is_read')
+    if change and bool(change[0]) != bool(change[1]):
+        _defer(target, UNREAD_NOTIFICATIONS, target.user_id, -1 if change[1] else 1)
+
+
+@event.listens_for(Notification, 'after_delete')
+def _notification_deleted(mapper, connection, target):
+    if not target.is_read:
+        _defer(target, UNREAD_NOTIFICATIONS, target.user_id, -1)
+
+
+@event.listens_for(Donation, 'after_insert')
+def _donation_inserted(mapper, connection, target):
+    if target.status == 'pending':
+        _defer(target, PENDING_DONATIONS, target.hospital_id, 1)
+
+
+@event.listens_for(Donation, 'after_update')
+def _donation_updated(mapper, connection, target):
+    status_change = _changed(target, 'status')
+    hospital_change = _changed(target, 'hospital_id')
+    if not status_change and not hospital_change:
+        return
+
+    old_status = status_change[0] if status_change else target.status
+    old_hospital = hospital_change[0] if hospital_change else target.hospital_id
+
+    if old_status == 'pending':
+        _defer(target, PENDING_DONATIONS, old_hospital, -1)
+    if target.status == 'pending':
+        _defer(target, PENDING_DONATIONS, target.hospital_id, 1)
+
+
+@event.listens_for(Donation, 'after_delete')
+def _donation_deleted(mapper, connection, target):
+    if target.status == 'pending':
+        _defer(target, PENDING_DONATIONS, target.hospital_id, -1)
+
+
+def _forget_deferred(target, name, owner_id):
+    # Rows deleted along with the owner must not seed its counter again
+    deltas = inspect(target).session.info.get('badge_counter_deltas')
+    if deltas:
+        deltas.pop((name, owner_id), None)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    _forget_deferred(target, UNREAD_NOTIFICATIONS, target.id)
+    connection.execute(_counters.delete().where(and_(
+        _counters.c.name == UNREAD_NOTIFICATIONS,
+        _counters.c.owner_id == target.id
+    )))
+
+
+@event.listens_for(HospitalProfile, 'after_delete')
+def _hospital_deleted(mapper, connection, target):
+    _forget_deferred(target, PENDING_DONATIONS, target.id)
+    connection.execute(_counters.delete().where(and_(
+        _counters.c.name == PENDING_DONATIONS,
+        _counters.c.owner_id == target.id
+    )))
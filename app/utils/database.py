@@ -0,0 +1,16 @@
+from sqlalchemy import event
+
+
+def configure_engine(engine, sqlite_pragmas):
+    """
+    Apply the configured pragmas to every new connection of a SQLite engine
+    """
+    if engine.dialect.name != 'sqlite' or not sqlite_pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
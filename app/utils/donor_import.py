@@ -0,0 +1,208 @@
+from flask import current_app
+from app import db
+from app.models.user import User, DonorProfile
+from app.models.donation import DonorSummary
+from app.utils.registration import clean_donor_rows, find_taken, unusable_password
+from app.utils.search import reindex
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+import bcrypt
+import csv
+import io
+import secrets
+import time
+
+# Rows validated, checked and inserted per transaction
+IMPORT_CHUNK_SIZE = 1000
+
+# Bcrypt hashes handed to each pool worker at a time
+HASH_BATCH_SIZE = 32
+
+
+class ImportResult:
+    """
+    Running totals for one roster import
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = {}  # row number -> messages
+        self.credentials = []  # (email, temporary password)
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def skipped(self):
+        return len(self.errors)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def read_roster(stream, filename):
+    """
+    Yield roster rows as dicts from a CSV or XLSX file without loading it all
+    """
+    if filename.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError('Reading XLSX rosters requires openpyxl; upload a CSV instead.')
+
+        sheet = load_workbook(stream, read_only=True, data_only=True).active
+        values = sheet.iter_rows(values_only=True)
+        header = [str(cell or '').strip() for cell in next(values, ())]
+        for cells in values:
+            if any(cell is not None for cell in cells):
+                yield {name: '' if cell is None else str(cell) for name, cell in zip(header, cells)}
+    else:
+        # utf-8-sig drops the byte order mark spreadsheet exports often add
+        text = stream if isinstance(stream, io.TextIOBase) else io.TextIOWrapper(stream, encoding='utf-8-sig')
+        yield from csv.DictReader(text)
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+class _Hasher:
+    """
+    Hashes batches of passwords, starting the process pool on first use
+    """
+
+    def __init__(self, rounds, workers):
+        self.rounds = rounds
+        self.workers = workers
+        self.pool = None
+
+    def hash_all(self, passwords):
+        if self.workers == 1 or len(passwords) < 2:
+            return [_hash(password, self.rounds) for password in passwords]
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        return list(self.pool.map(_hash, passwords, [self.rounds] * len(passwords), chunksize=HASH_BATCH_SIZE))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def _import_chunk(chunk, first_row, seen_emails, seen_phones, temporary_passwords, hasher, result):
+    accounts = []
+    for offset, (account, errors) in enumerate(clean_donor_rows(chunk)):
+        number = first_row + offset
+        if account:
+            if account['email'] in seen_emails:
+                errors.append('email appears more than once in the roster')
+            if account['phone'] in seen_phones:
+                errors.append('phone appears more than once in the roster')
+        if errors:
+            result.errors[number] = errors
+            continue
+        seen_emails.add(account['email'])
+        seen_phones.add(account['phone'])
+        accounts.append((number, account))
+
+    taken_emails, _, taken_phones = find_taken(
+        emails=[account['email'] for number, account in accounts],
+        phones=[account['phone'] for number, account in accounts]
+    )
+
+    new_accounts = []
+    for number, account in accounts:
+        errors = []
+        if account['email'] in taken_emails:
+            errors.append('email is already registered')
+        if account['phone'] in taken_phones:
+            errors.append('phone is already registered to a donor')
+        if errors:
+            result.errors[number] = errors
+        else:
+            new_accounts.append(account)
+
+    if not new_accounts:
+        return
+
+    # Accounts without a password get a temporary one, or one no login matches
+    for account in new_accounts:
+        if not account['password'] and temporary_passwords:
+            account['password'] = secrets.token_urlsafe(9)
+            result.credentials.append((account['email'], account['password']))
+
+    to_hash = [account for account in new_accounts if account['password']]
+    for account, password_hash in zip(to_hash, hasher.hash_all([account['password'] for account in to_hash])):
+        account['password'] = password_hash
+
+    # Core executemany inserts, without the ORM events
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [{
+        'email': account['email'],
+        'password': account['password'] or unusable_password(),
+        'role': 'donor',
+        'email_verified': False,
+        'phone_verified': False,
+        'created_at': now
+    } for account in new_accounts])
+
+    user_ids = dict(db.session.query(User.email, User.id).filter(
+        User.email.in_([account['email'] for account in new_accounts])
+    ))
+    db.session.execute(DonorProfile.__table__.insert(), [{
+        'user_id': user_ids[account['email']],
+        'name': account['name'],
+        'age': account['age'],
+        'gender': account['gender'],
+        'blood_group': account['blood_group'],
+        'weight': account['weight'],
+        'phone': account['phone'],
+        'address': account['address'],
+        'pincode': account['pincode'],
+        'email_notifications': True,
+        'sms_notifications': False,
+        'donation_reminders': True,
+        'eligibility_alerts': True
+    } for account in new_accounts])
+    # Core inserts skip the summary and search index hooks
+    db.session.execute(DonorSummary.__table__.insert(), [{
+        'donor_id': user_id, 'total_donations': 0, 'completed_count': 0, 'total_units': 0
+    } for user_id in user_ids.values()])
+    reindex(db.session.connection(), 'donor', user_ids.values())
+    db.session.commit()
+    result.created += len(new_accounts)
+
+
+def import_donors(rows, chunk_size=IMPORT_CHUNK_SIZE, temporary_passwords=False, workers=None):
+    """
+    Stream donor roster rows into the database one chunk per transaction.
+    Rows are validated a chunk at a time, deduplicated by email and phone
+    against the roster so far and the database, and bulk inserted. Passwords
+    are hashed across a process pool of workers processes (None for one per
+    core, 1 to hash in this process). With temporary_passwords, rows without
+    a password get a generated one, returned in result.credentials.
+    """
+    result = ImportResult()
+    hasher = _Hasher(current_app.config.get('BCRYPT_LOG_ROUNDS', 12), workers)
+    seen_emails, seen_phones = set(), set()
+
+    try:
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            try:
+                _import_chunk(chunk, result.rows + 1, seen_emails, seen_phones,
+                              temporary_passwords, hasher, result)
+            except Exception:
+                db.session.rollback()
+                raise
+            result.rows += len(chunk)
+            current_app.logger.info(f"Donor import: {result.rows} rows, {result.created} created")
+    finally:
+        hasher.close()
+        result.elapsed = time.perf_counter() - result.started
+
+    return result
@@ -0,0 +1,184 @@
+from app import db
+from app.models.user import User, DonorProfile
+from app.models.donation import Donation, DonorSummary
+from sqlalchemy import event, inspect, and_, case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+_summaries = DonorSummary.__table__
+_donations = Donation.__table__
+_profiles = DonorProfile.__table__
+
+# INSERT ... ON CONFLICT for the databases the app runs on
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def _contribution(status, units):
+    """
+    (completed_count, total_units) a donation adds to its donor's summary
+    """
+    if status == 'completed':
+        return 1, units or 0
+    return 0, 0
+
+
+def _source_summary(connection, donor_id):
+    """
+    Compute a donor's summary from the donation and profile tables
+    """
+    total, completed, units = connection.execute(select(
+        func.count(),
+        func.coalesce(func.sum(case((_donations.c.status == 'completed', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((_donations.c.status == 'completed', _donations.c.units), else_=0)), 0)
+    ).where(_donations.c.donor_id == donor_id)).one()
+    last_donation_date = connection.execute(select(_profiles.c.last_donation_date).where(
+        _profiles.c.user_id == donor_id
+    )).scalar()
+    return {
+        'total_donations': total,
+        'completed_count': completed,
+        'total_units': units,
+        'last_donation_date': last_donation_date,
+    }
+
+
+def adjust(connection, donor_id, total=0, completed=0, units=0):
+    """
+    Apply deltas to a donor's summary within the caller's transaction. The
+    summary is created with the donor profile; users without one have none.
+    """
+    if donor_id is None or not (total or completed or units):
+        return
+
+    connection.execute(_summaries.update().where(_summaries.c.donor_id == donor_id).values(
+        total_donations=_summaries.c.total_donations + total,
+        completed_count=_summaries.c.completed_count + completed,
+        total_units=_summaries.c.total_units + units
+    ))
+
+
+def get_summary(donor_id):
+    """
+    Read a donor's summary with a primary key lookup. One missing its row is
+    computed from the source tables, without storing it; the reconcile job
+    recreates it.
+    """
+    summary = DonorSummary.query.get(donor_id)
+    if summary is None:
+        summary = DonorSummary(donor_id=donor_id, **_source_summary(db.session.connection(), donor_id))
+    return summary
+
+
+def reconcile_donor_summaries():
+    """
+    Recompute every summary from the source tables, repair any drift and
+    create those missing for a donor profile. Each repair is a compare-and-set
+    against the row read before recomputing, so a summary adjusted meanwhile
+    is left for the next run. Returns the number of summaries repaired or
+    created.
+    """
+    stored = {row.donor_id: row for row in db.session.query(
+        _summaries.c.donor_id, _summaries.c.total_donations, _summaries.c.completed_count,
+        _summaries.c.total_units, _summaries.c.last_donation_date
+    ).all()}
+
+    actual = {}
+    for donor_id, total, completed, units in db.session.query(
+        Donation.donor_id,
+        func.count(Donation.id),
+        func.sum(case((Donation.status == 'completed', 1), else_=0)),
+        func.sum(case((Donation.status == 'completed', Donation.units), else_=0))
+    ).group_by(Donation.donor_id).all():
+        actual[donor_id] = (total, completed, units)
+    last_dates = dict(db.session.query(DonorProfile.user_id, DonorProfile.last_donation_date).all())
+
+    def values(donor_id):
+        total, completed, units = actual.get(donor_id, (0, 0, 0))
+        return {
+            'total_donations': total,
+            'completed_count': completed,
+            'total_units': units,
+            'last_donation_date': last_dates.get(donor_id),
+        }
+
+    connection = db.session.connection()
+    corrected = 0
+    for donor_id, seen in stored.items():
+        value = values(donor_id)
+        if any(getattr(seen, key) != value[key] for key in value):
+            corrected += connection.execute(_summaries.update().where(and_(
+                _summaries.c.donor_id == donor_id,
+                _summaries.c.total_donations == seen.total_donations,
+                _summaries.c.completed_count == seen.completed_count,
+                _summaries.c.total_units == seen.total_units,
+                _summaries.c.last_donation_date.isnot_distinct_from(seen.last_donation_date)
+            )).values(**value)).rowcount
+
+    # Profiles without a summary; one inserted meanwhile is kept
+    insert = _INSERTS[connection.dialect.name](_summaries)
+    for donor_id in set(last_dates) - set(stored):
+        corrected += connection.execute(
+            insert.values(donor_id=donor_id, **values(donor_id)).on_conflict_do_nothing()
+        ).rowcount
+
+    db.session.commit()
+    return corrected
+
+
+def _previous(target, attribute):
+    """
+    The value an attribute had before the current flush
+    """
+    history = inspect(target).attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attribute)
+
+
+@event.listens_for(Donation, 'after_insert')
+def _donation_inserted(mapper, connection, target):
+    completed, units = _contribution(target.status, target.units)
+    adjust(connection, target.donor_id, 1, completed, units)
+
+
+@event.listens_for(Donation, 'after_update')
+def _donation_updated(mapper, connection, target):
+    old_donor = _previous(target, 'donor_id')
+    old_completed, old_units = _contribution(_previous(target, 'status'), _previous(target, 'units'))
+    completed, units = _contribution(target.status, target.units)
+
+    if old_donor != target.donor_id:
+        adjust(connection, old_donor, -1, -old_completed, -old_units)
+        adjust(connection, target.donor_id, 1, completed, units)
+    else:
+        adjust(connection, target.donor_id, 0, completed - old_completed, units - old_units)
+
+
+@event.listens_for(Donation, 'after_delete')
+def _donation_deleted(mapper, connection, target):
+    completed, units = _contribution(target.status, target.units)
+    adjust(connection, target.donor_id, -1, -completed, -units)
+
+
+@event.listens_for(DonorProfile, 'after_insert')
+def _donor_profile_inserted(mapper, connection, target):
+    # Created with the profile, so adjust always has a row to update
+    exists = connection.execute(select(_summaries.c.donor_id).where(
+        _summaries.c.donor_id == target.user_id
+    )).first()
+    if exists is None:
+        connection.execute(_summaries.insert().values(
+            donor_id=target.user_id, **_source_summary(connection, target.user_id)
+        ))
+
+
+@event.listens_for(DonorProfile, 'after_update')
+def _donor_profile_updated(mapper, connection, target):
+    if inspect(target).attrs['last_donation_date'].history.has_changes():
+        connection.execute(_summaries.update().where(_summaries.c.donor_id == target.user_id).values(
+            last_donation_date=target.last_donation_date
+        ))
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    connection.execute(_summaries.delete().where(_summaries.c.donor_id == target.id))
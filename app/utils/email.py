@@ -3,12 +3,6 @@ from flask_mail import Message, Mail
 from app import mail
 from itsdangerous import URLSafeTimedSerializer
 import os
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from io import BytesIO
 from datetime import datetime
 
@@ -54,6 +48,14 @@ mail = Mail()
 
 def generate_donation_certificate(donation, hospital):
     """Generate a PDF certificate for blood donation."""
+    # ReportLab is slow to import, so load it on first use rather than at startup
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    
     try:
         buffer = BytesIO()
         
@@ -0,0 +1,70 @@
+from collections import defaultdict
+from threading import Lock
+import queue
+
+# Events buffered per connection before it is told to resynchronise
+MAX_QUEUED_EVENTS = 100
+
+
+class EventBroker:
+    """
+    In-process publish/subscribe of per-user events for Server-Sent Events streams.
+
+    Each open stream subscribes a queue for its user and rereads the user's
+    counts when an event arrives. Publishing never blocks: if a slow client's
+    queue fills up it is emptied and sent a single 'resync' event, which
+    triggers the same reread.
+    """
+
+    def __init__(self, max_queued=MAX_QUEUED_EVENTS):
+        self.max_queued = max_queued
+        self._subscribers = defaultdict(set)
+        self._lock = Lock()
+
+    def subscribe(self, user_id):
+        subscriber = queue.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(('resync', {}))
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+broker = EventBroker()
+
+
+def publish(user_id, event, data):
+    """
+    Push an event to every open stream of a user in this process
+    """
+    broker.publish(user_id, event, data)
+
+
+def publish_notification_delta(user_id, delta=1):
+    publish(user_id, 'notifications', {'delta': delta})
+
+
+def publish_pending_delta(hospital_user_id, delta):
+    publish(hospital_user_id, 'pending_donations', {'delta': delta})
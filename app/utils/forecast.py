@@ -0,0 +1,266 @@
+from app import db
+from app.models.user import User, DonorProfile, HospitalProfile
+from app.models.donation import Donation, BloodInventory, InventorySnapshot, ShortageForecast, Notification
+from app.utils.inventory import BLOOD_GROUPS
+from app.utils.sms import send_blood_request_notification
+from datetime import datetime, date, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import contains_eager
+import numpy as np
+import math
+
+# Days of snapshot and donation history used for the forecast
+HISTORY_DAYS = 56
+
+# Trailing window for the average donation inflow
+DONATION_WINDOW_DAYS = 14
+
+# Weight of the most recent day in the exponentially smoothed consumption rate
+SMOOTHING_ALPHA = 0.3
+
+# Broadcast a request when a group is expected to run out within this many days
+ALERT_DAYS_OF_SUPPLY = 3
+
+# Broadcasts ask for enough units to cover this many days of net usage
+TARGET_DAYS_OF_SUPPLY = 7
+
+ALERT_COOLDOWN = timedelta(hours=24)
+
+
+def record_inventory_snapshot(today=None):
+    """
+    Store today's stock level for every hospital and blood group.
+    Running it more than once a day overwrites the day's snapshot.
+    """
+    today = today or datetime.utcnow().date()
+
+    existing = {
+        (snap.hospital_id, snap.blood_group): snap
+        for snap in InventorySnapshot.query.filter_by(taken_on=today).all()
+    }
+
+    for hospital_id, blood_group, units in db.session.query(
+        BloodInventory.hospital_id, BloodInventory.blood_group, BloodInventory.units
+    ).all():
+        snapshot = existing.get((hospital_id, blood_group))
+        if snapshot:
+            snapshot.units = units
+        else:
+            db.session.add(InventorySnapshot(
+                hospital_id=hospital_id,
+                blood_group=blood_group,
+                units=units,
+                taken_on=today
+            ))
+
+    db.session.commit()
+
+
+def _as_date(value):
+    # func.date() returns a string on SQLite and a date on PostgreSQL
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _load_history(start, today):
+    """
+    Load snapshot stock levels and daily donation inflow as
+    (hospitals x blood groups x days) arrays.
+    Days without a snapshot are NaN in the stock array.
+    """
+    hospital_ids = [row.id for row in db.session.query(HospitalProfile.id).order_by(HospitalProfile.id).all()]
+    hospital_index = {hospital_id: i for i, hospital_id in enumerate(hospital_ids)}
+    group_index = {bg: i for i, bg in enumerate(BLOOD_GROUPS)}
+    days = (today - start).days + 1
+
+    stock = np.full((len(hospital_ids), len(BLOOD_GROUPS), days), np.nan)
+    inflow = np.zeros((len(hospital_ids), len(BLOOD_GROUPS), days))
+
+    snapshots = db.session.query(
+        InventorySnapshot.hospital_id,
+        InventorySnapshot.blood_group,
+        InventorySnapshot.taken_on,
+        InventorySnapshot.units
+    ).filter(InventorySnapshot.taken_on >= start).all()
+
+    snapshots = [s for s in snapshots if s.hospital_id in hospital_index and s.blood_group in group_index]
+    if snapshots:
+        h = np.array([hospital_index[s.hospital_id] for s in snapshots])
+        g = np.array([group_index[s.blood_group] for s in snapshots])
+        d = np.array([(s.taken_on - start).days for s in snapshots])
+        stock[h, g, d] = [s.units for s in snapshots]
+
+    # Approved donations are added to stock on the approval date
+    approval_day = func.date(Donation.approval_date)
+    donations = db.session.query(
+        Donation.hospital_id,
+        Donation.blood_group,
+        approval_day,
+        func.sum(Donation.units)
+    ).filter(
+        Donation.status.in_(['approved', 'completed']),
+        Donation.approval_date >= datetime.combine(start, datetime.min.time())
+    ).group_by(
+        Donation.hospital_id, Donation.blood_group, approval_day
+    ).all()
+
+    donations = [row for row in donations if row[0] in hospital_index and row[1] in group_index]
+    if donations:
+        h = np.array([hospital_index[row[0]] for row in donations])
+        g = np.array([group_index[row[1]] for row in donations])
+        d = np.array([(_as_date(row[2]) - start).days for row in donations])
+        np.add.at(inflow, (h, g, d), [row[3] or 0 for row in donations])
+
+    return hospital_ids, stock, inflow
+
+
+def compute_rates(stock, inflow, alpha=SMOOTHING_ALPHA, window=DONATION_WINDOW_DAYS):
+    """
+    Estimate per-series daily consumption and donation rates.
+
+    Snapshots are taken early on each day, so donations approved on day t land
+    between snapshot t and snapshot t+1. Consumption over that interval is what
+    the stock lost after accounting for them. It is exponentially smoothed
+    across days, skipping days where a snapshot is missing. Donation rate is
+    the trailing window mean of inflow over complete days, leaving out today.
+    """
+    consumption = stock[..., :-1] + inflow[..., :-1] - stock[..., 1:]
+    # Manual restocking shows up as negative consumption
+    consumption = np.clip(consumption, 0, None)
+
+    level = np.full(stock.shape[:-1], np.nan)
+    for t in range(consumption.shape[-1]):
+        observed = consumption[..., t]
+        smoothed = np.where(np.isnan(level), observed, alpha * observed + (1 - alpha) * level)
+        level = np.where(np.isnan(observed), level, smoothed)
+    consumption_rate = np.nan_to_num(level, nan=0.0)
+
+    complete_days = inflow[..., :-1]
+    if complete_days.shape[-1]:
+        donation_rate = complete_days[..., -window:].mean(axis=-1)
+    else:
+        donation_rate = np.zeros(stock.shape[:-1])
+
+    return consumption_rate, donation_rate
+
+
+def update_shortage_forecasts(today=None):
+    """
+    Snapshot current stock, recompute rates for every hospital and blood group
+    and cache the results in ShortageForecast.
+    """
+    today = today or datetime.utcnow().date()
+    record_inventory_snapshot(today)
+
+    start = today - timedelta(days=HISTORY_DAYS - 1)
+    hospital_ids, stock, inflow = _load_history(start, today)
+    if not hospital_ids:
+        return 0
+
+    consumption_rate, donation_rate = compute_rates(stock, inflow)
+
+    current_units = np.zeros(consumption_rate.shape)
+    hospital_index = {hospital_id: i for i, hospital_id in enumerate(hospital_ids)}
+    group_index = {bg: i for i, bg in enumerate(BLOOD_GROUPS)}
+    for hospital_id, blood_group, units in db.session.query(
+        BloodInventory.hospital_id, BloodInventory.blood_group, BloodInventory.units
+    ).all():
+        if hospital_id in hospital_index and blood_group in group_index:
+            current_units[hospital_index[hospital_id], group_index[blood_group]] = units
+
+    net_usage = consumption_rate - donation_rate
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_supply = np.where(net_usage > 0, current_units / net_usage, np.nan)
+
+    existing = {
+        (f.hospital_id, f.blood_group): f
+        for f in ShortageForecast.query.all()
+    }
+    now = datetime.utcnow()
+
+    for hospital_id, i in hospital_index.items():
+        for blood_group, j in group_index.items():
+            forecast = existing.get((hospital_id, blood_group))
+            if not forecast:
+                forecast = ShortageForecast(hospital_id=hospital_id, blood_group=blood_group)
+                db.session.add(forecast)
+
+            forecast.units = int(current_units[i, j])
+            forecast.consumption_rate = round(float(consumption_rate[i, j]), 3)
+            forecast.donation_rate = round(float(donation_rate[i, j]), 3)
+            forecast.days_of_supply = None if np.isnan(days_of_supply[i, j]) else round(float(days_of_supply[i, j]), 1)
+            forecast.computed_at = now
+
+    db.session.commit()
+    return len(hospital_ids) * len(BLOOD_GROUPS)
+
+
+def _alert_recipients(forecasts, since):
+    """
+    Donors to text for each forecast, most urgent first: those of the blood
+    group in the hospital's pincode, each at most once per run and not at
+    all if a blood request reached them since the given time
+    """
+    pincodes = dict(db.session.query(HospitalProfile.id, HospitalProfile.pincode).filter(
+        HospitalProfile.id.in_({forecast.hospital_id for forecast in forecasts})
+    ).all())
+    candidates = {}
+    for donor in User.query.join(User.donor_profile).options(contains_eager(User.donor_profile)).filter(
+        User.role == 'donor',
+        DonorProfile.blood_group.in_({forecast.blood_group for forecast in forecasts}),
+        DonorProfile.pincode.in_(set(pincodes.values()))
+    ).all():
+        candidates.setdefault((donor.donor_profile.pincode, donor.donor_profile.blood_group), []).append(donor)
+
+    alerted = {user_id for user_id, in db.session.query(Notification.user_id).filter(
+        Notification.notification_type == 'blood_request',
+        Notification.is_sent == True,
+        Notification.created_at > since
+    ).distinct()}
+
+    recipients = []
+    for forecast in sorted(forecasts, key=lambda forecast: forecast.days_of_supply):
+        donors = [donor for donor in candidates.get((pincodes.get(forecast.hospital_id), forecast.blood_group), [])
+                  if donor.id not in alerted]
+        alerted.update(donor.id for donor in donors)
+        recipients.append((forecast, donors))
+    return recipients
+
+
+def send_shortage_alerts():
+    """
+    Broadcast blood requests for groups forecast to run out soon to donors in
+    the hospital's pincode. Each hospital and blood group is alerted, and each
+    donor texted, at most once per cooldown period.
+    """
+    now = datetime.utcnow()
+    forecasts = [forecast for forecast in ShortageForecast.query.filter(
+        ShortageForecast.days_of_supply.isnot(None),
+        ShortageForecast.days_of_supply < ALERT_DAYS_OF_SUPPLY
+    ).all() if not (forecast.last_alert_at and forecast.last_alert_at > now - ALERT_COOLDOWN)]
+    if not forecasts:
+        return 0
+
+    alerts = 0
+    for forecast, donors in _alert_recipients(forecasts, now - ALERT_COOLDOWN):
+        net_usage = forecast.consumption_rate - forecast.donation_rate
+        units_needed = max(1, math.ceil(net_usage * TARGET_DAYS_OF_SUPPLY - forecast.units))
+
+        success_count, failed_count = send_blood_request_notification(
+            forecast.hospital_id,
+            forecast.blood_group,
+            units_needed,
+            donors=donors
+        )
+        current_app.logger.info(
+            f"Shortage alert for hospital {forecast.hospital_id} {forecast.blood_group}: "
+            f"{forecast.days_of_supply} days of supply, {success_count} donors notified, {failed_count} failed"
+        )
+
+        forecast.last_alert_at = now
+        db.session.commit()
+        alerts += 1
+
+    return alerts
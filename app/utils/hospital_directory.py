@@ -0,0 +1,130 @@
+from flask import current_app
+from app import db
+from app.models.user import HospitalProfile
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from threading import Lock
+import re
+import time
+
+# Results returned to an autocomplete
+AUTOCOMPLETE_LIMIT = 10
+
+# Seconds before a directory is rebuilt even without local changes, so
+# profile edits handled by other worker processes are picked up
+DIRECTORY_TTL = 300
+
+_build_lock = Lock()
+
+
+def _words(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+class HospitalDirectory:
+    """
+    In-memory directory of hospitals for autocomplete, built from one query.
+
+    Every word of every name is added to a prefix trie whose nodes list the
+    hospitals (by position in name order) with a word starting there, so a
+    query is one walk down the trie per word and an intersection of the
+    lists. Hospitals are also grouped by pincode for donors, who may only
+    pick a hospital in their own area.
+    """
+
+    def __init__(self, hospitals):
+        self.built_at = time.monotonic()
+        self.hospitals = sorted(hospitals, key=lambda hospital: (hospital['name'].lower(), hospital['id']))
+        self.by_id = {}
+        self.by_pincode = {}
+        self.trie = {}
+
+        for position, hospital in enumerate(self.hospitals):
+            self.by_id[hospital['id']] = hospital
+            self.by_pincode.setdefault(hospital['pincode'], []).append(position)
+            for word in set(_words(hospital['name'])):
+                node = self.trie
+                for char in word:
+                    node = node.setdefault(char, {})
+                    node.setdefault(None, []).append(position)
+
+    def _prefixed(self, word):
+        node = self.trie
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node[None]
+
+    def get(self, hospital_id):
+        return self.by_id.get(hospital_id)
+
+    def in_pincode(self, pincode):
+        return [self.hospitals[position] for position in self.by_pincode.get(pincode, [])]
+
+    def search(self, query, pincode=None, limit=AUTOCOMPLETE_LIMIT):
+        """
+        Hospitals with a name word starting with each word of the query, in
+        name order, optionally only those in one pincode. An empty query
+        matches every hospital of the pincode and none otherwise.
+        """
+        candidates = [self._prefixed(word) for word in _words(query)]
+        if pincode is not None:
+            candidates.append(self.by_pincode.get(pincode, []))
+        if not candidates:
+            return []
+
+        # Positions are in name order; intersect starting from the shortest list
+        candidates.sort(key=len)
+        if len(candidates) == 1:
+            positions = candidates[0][:limit]
+        else:
+            positions = sorted(set(candidates[0]).intersection(*candidates[1:]))[:limit]
+        return [self.hospitals[position] for position in positions]
+
+
+def _load():
+    rows = db.session.query(
+        HospitalProfile.id, HospitalProfile.user_id, HospitalProfile.name,
+        HospitalProfile.address, HospitalProfile.pincode
+    ).all()
+    return HospitalDirectory([row._asdict() for row in rows])
+
+
+def get_directory():
+    """
+    The app's hospital directory, rebuilt if a hospital profile changed in
+    this process or it is older than DIRECTORY_TTL
+    """
+    directory = current_app.extensions.get('hospital_directory')
+    if directory is None or time.monotonic() - directory.built_at > DIRECTORY_TTL:
+        with _build_lock:
+            directory = current_app.extensions.get('hospital_directory')
+            if directory is None or time.monotonic() - directory.built_at > DIRECTORY_TTL:
+                directory = _load()
+                current_app.extensions['hospital_directory'] = directory
+    return directory
+
+
+def invalidate():
+    current_app.extensions.pop('hospital_directory', None)
+
+
+@event.listens_for(HospitalProfile, 'after_insert')
+@event.listens_for(HospitalProfile, 'after_update')
+@event.listens_for(HospitalProfile, 'after_delete')
+def _hospital_changed(mapper, connection, target):
+    # A request rebuilding the directory before this commits would cache the
+    # old rows, so it is dropped once the change is committed
+    inspect(target).session.info['hospital_directory_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('hospital_directory_changed', False):
+        invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_change(session):
+    session.info.pop('hospital_directory_changed', None)
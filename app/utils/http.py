@@ -0,0 +1,153 @@
+from flask import current_app, request, session
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from functools import wraps
+from werkzeug.http import is_resource_modified
+from app.utils.cache import TTLCache
+import gzip
+import hashlib
+import os
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 512
+
+# Compression levels: gzip 1-9, brotli 0-11. Mid levels keep CPU per
+# response low for dynamic JSON while getting most of the size reduction.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Fingerprinted static files never change under their URL, so browsers may
+# keep them for a year
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# Stands in for the per-session CSRF token in cached pages
+CSRF_PLACEHOLDER = '__csrf_token_placeholder__'
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Static file path -> (modification time, content hash)
+_digests = {}
+
+
+def make_etag(*parts):
+    """
+    A weak entity tag from the values that determine a response, so it stays
+    valid across encodings of the same content
+    """
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def not_modified(etag, last_modified=None):
+    """
+    Whether the client's If-None-Match or If-Modified-Since shows it already
+    has this version of the resource
+    """
+    if last_modified is not None:
+        # HTTP dates have whole-second precision
+        last_modified = last_modified.replace(microsecond=0)
+    return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(microsecond=0)
+    # Clients may reuse the response but must check it is still current
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def compress_response(response):
+    """
+    Compress a response body with brotli or gzip, whichever the client
+    accepts (brotli preferred, when installed)
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 304) or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def cached_page(f):
+    """
+    Serve an anonymous page from a per-worker cache of its rendered HTML for
+    PAGE_CACHE_SECONDS. The CSRF token in the layout is swapped in per
+    request. Visitors who are signed in or have flashed messages waiting get
+    the page rendered as usual.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        ttl = current_app.config['PAGE_CACHE_SECONDS']
+        if not ttl or request.method != 'GET' or current_user.is_authenticated or '_flashes' in session:
+            return f(*args, **kwargs)
+
+        pages = current_app.extensions.get('page_cache')
+        if pages is None:
+            pages = current_app.extensions['page_cache'] = TTLCache(maxsize=256, ttl=ttl)
+
+        key = request.path
+        html = pages.get(key)
+        if html is None:
+            token = generate_csrf()
+            html = f(*args, **kwargs)
+            if not isinstance(html, str):
+                # A redirect or error response, not a page
+                return html
+            html = html.replace(token, CSRF_PLACEHOLDER)
+            pages.set(key, html)
+        return html.replace(CSRF_PLACEHOLDER, generate_csrf())
+    return decorated_function
+
+
+def _static_digest(filename):
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    entry = _digests.get(path)
+    if entry is None or entry[0] != mtime:
+        with open(path, 'rb') as file:
+            entry = _digests[path] = (mtime, hashlib.md5(file.read()).hexdigest()[:12])
+    return entry[1]
+
+
+def fingerprint_static(endpoint, values):
+    """
+    URL defaults callback adding a content hash to url_for('static', ...), so
+    a changed file gets a new URL and the old one can be cached for good
+    """
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        digest = _static_digest(values['filename'])
+        if digest:
+            values['v'] = digest
+
+
+def cache_static(response):
+    """
+    Let browsers keep fingerprinted static files without revalidating
+    """
+    if request.endpoint == 'static' and 'v' in request.args and response.status_code in (200, 304):
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
@@ -0,0 +1,82 @@
+from app import db
+from app.models.user import HospitalProfile
+from app.models.donation import BloodInventory
+from sqlalchemy import func, case
+
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+# Units at or below this level are highlighted as low stock
+LOW_STOCK_THRESHOLD = 5
+
+MATRIX_SORTS = ('shortage', 'name', 'total')
+
+
+def _group_units(blood_group):
+    """
+    Aggregate expression for the units of one blood group within a hospital row
+    """
+    return func.coalesce(func.sum(case(
+        (BloodInventory.blood_group == blood_group, BloodInventory.units),
+        else_=0
+    )), 0)
+
+
+def inventory_matrix(page=1, per_page=20, sort='shortage', threshold=LOW_STOCK_THRESHOLD):
+    """
+    Build a paginated hospital x blood group inventory matrix with a single
+    aggregate query. Missing inventory rows count as zero units.
+
+    Returns the pagination object and a list of row dictionaries for the page.
+    """
+    group_columns = [_group_units(bg).label(f'units_{i}') for i, bg in enumerate(BLOOD_GROUPS)]
+
+    # Shortage is the total number of units needed to lift every low group above
+    # the threshold, so it counts exactly the cells flagged low below
+    shortage = sum(case((col <= threshold, threshold + 1 - col), else_=0) for col in group_columns)
+    low_count = sum(case((col <= threshold, 1), else_=0) for col in group_columns)
+    total = func.coalesce(func.sum(BloodInventory.units), 0)
+
+    query = db.session.query(
+        HospitalProfile.id,
+        HospitalProfile.name,
+        HospitalProfile.pincode,
+        *group_columns,
+        total.label('total_units'),
+        shortage.label('shortage'),
+        low_count.label('low_count')
+    ).outerjoin(
+        BloodInventory, BloodInventory.hospital_id == HospitalProfile.id
+    ).group_by(
+        HospitalProfile.id, HospitalProfile.name, HospitalProfile.pincode
+    )
+
+    if sort == 'name':
+        query = query.order_by(HospitalProfile.name.asc())
+    elif sort == 'total':
+        query = query.order_by(total.desc(), HospitalProfile.name.asc())
+    else:
+        query = query.order_by(shortage.desc(), HospitalProfile.name.asc())
+
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+
+    rows = []
+    for row in pagination.items:
+        cells = []
+        for i, bg in enumerate(BLOOD_GROUPS):
+            units = int(getattr(row, f'units_{i}'))
+            cells.append({
+                'blood_group': bg,
+                'units': units,
+                'low': units <= threshold
+            })
+        rows.append({
+            'hospital_id': row.id,
+            'name': row.name,
+            'pincode': row.pincode,
+            'cells': cells,
+            'total_units': int(row.total_units),
+            'shortage': int(row.shortage),
+            'low_count': int(row.low_count)
+        })
+
+    return pagination, rows
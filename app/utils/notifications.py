@@ -1,16 +1,25 @@
 from flask import current_app, render_template
 from app import mail
 from flask_mail import Message
-from app.models.donation import Notification
+from app.models.donation import Notification, NotificationArchive
 from app.models.user import User
 from app import db
+from app.utils.events import publish_notification_delta
+from app.utils.counters import bump_many, UNREAD_NOTIFICATIONS
+from sqlalchemy import event, select
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Read notifications older than this are moved to the archive table
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Rows moved per archive transaction, to keep locks short
+ARCHIVE_BATCH_SIZE = 5000
+
 def send_email_notification(notification_id):
     """
     Send an email notification based on the notification ID
@@ -201,9 +210,65 @@ def send_notification(user_id, title, message, notification_type, delivery_metho
             db.session.commit()
             
             results["sms"] = send_sms_notification(sms_notification.id)
+        
+        # Every row created above starts unread
+        publish_notification_delta(user_id, 1 + ("email" in results) + ("sms" in results))
             
         return {"success": True, "results": results}
         
     except Exception as e:
         logger.error(f"Error creating notification: {str(e)}")
         return {"success": False, "error": str(e)}
+
+def mark_notifications_read(user_id, notification_ids=None):
+    """
+    Mark all of a user's unread notifications, or just notification_ids, as read
+    in one statement and commit. Returns the number of notifications changed.
+    """
+    changed = Notification.mark_all_read(user_id, notification_ids)
+
+    # A bulk UPDATE skips the ORM hooks that maintain the unread counter
+    bump_many(UNREAD_NOTIFICATIONS, {user_id: -changed})
+    db.session.commit()
+
+    if changed:
+        publish_notification_delta(user_id, -changed)
+    return changed
+
+def archive_read_notifications(retention_days=NOTIFICATION_RETENTION_DAYS, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    """
+    Move read notifications older than the retention period to the archive
+    table, one batch per transaction. Returns the number of rows archived.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    live = Notification.__table__
+    archive = NotificationArchive.__table__
+    columns = [column.name for column in archive.columns if column.name != 'archived_at']
+    archived = 0
+
+    while True:
+        ids = [row.id for row in db.session.query(Notification.id).filter(
+            Notification.is_read == True,
+            Notification.created_at < cutoff
+        ).order_by(Notification.id).limit(batch_size)]
+        if not ids:
+            break
+
+        db.session.execute(archive.insert().from_select(
+            columns + ['archived_at'],
+            select(*[live.c[name] for name in columns], db.literal(datetime.utcnow())).where(live.c.id.in_(ids))
+        ))
+        db.session.execute(live.delete().where(live.c.id.in_(ids)))
+        db.session.commit()
+        archived += len(ids)
+
+    return archived
+
+
+@event.listens_for(User, 'before_delete')
+def _user_deleting(mapper, connection, target):
+    # Archived notifications are not a relationship of User, so the ORM cascade
+    # does not reach them; the foreign key cascade only covers new databases
+    connection.execute(NotificationArchive.__table__.delete().where(
+        NotificationArchive.__table__.c.user_id == target.id
+    ))
@@ -0,0 +1,62 @@
+from flask import current_app
+from app import bcrypt
+
+# bcrypt cost used when BCRYPT_LOG_ROUNDS is not configured
+DEFAULT_LOG_ROUNDS = 12
+
+
+def _run_blocking(func, *args):
+    """
+    Run CPU-bound hashing in gevent's native thread pool when the worker is
+    monkey-patched, so one login does not stall every other greenlet.
+    """
+    try:
+        from gevent import monkey, get_hub
+    except ImportError:
+        return func(*args)
+
+    if not monkey.is_module_patched('threading'):
+        return func(*args)
+    return get_hub().threadpool.apply(func, args)
+
+
+def hash_password(password):
+    """
+    Hash a password at the configured cost
+    """
+    return _run_blocking(bcrypt.generate_password_hash, password).decode('utf-8')
+
+
+def check_password(password_hash, password):
+    try:
+        return _run_blocking(bcrypt.check_password_hash, password_hash, password)
+    except ValueError:
+        # Not a bcrypt hash, e.g. an imported account that has not set a password
+        return False
+
+
+def hash_cost(password_hash):
+    """
+    Read the cost factor out of a bcrypt hash such as $2b$12$...
+    """
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_cost(password_hash) != current_app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_LOG_ROUNDS)
+
+
+def verify_and_update(user, password):
+    """
+    Check a user's password and, if it was hashed at a different cost than
+    configured, replace the hash. The caller commits.
+    """
+    if not check_password(user.password, password):
+        return False
+
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+    return True
@@ -0,0 +1,208 @@
+from flask import current_app, request, jsonify, render_template, g
+from flask_login import current_user
+from functools import wraps
+from threading import Lock, local
+import math
+import sqlite3
+import time
+
+# Memory store entries kept before stale windows are pruned
+MEMORY_STORE_MAX_KEYS = 100000
+
+
+class MemoryStore:
+    """
+    Per-process sliding-window counters. Cheap, but each worker process
+    enforces its own share of the limit.
+    """
+
+    def __init__(self, max_keys=MEMORY_STORE_MAX_KEYS):
+        self.max_keys = max_keys
+        self._windows = {}  # key -> [window_start, current, previous]
+        self._lock = Lock()
+
+    def hit(self, key, limit, period, now, count=True):
+        with self._lock:
+            if len(self._windows) >= self.max_keys:
+                self._prune(now)
+            window = self._windows.get(key)
+            allowed, retry_after, window = _slide(window, limit, period, now, count)
+            self._windows[key] = window
+            return allowed, retry_after
+
+    def _prune(self, now):
+        # A key is stale once both of its windows have passed; periods vary
+        # by key, so treat anything untouched for a day as stale
+        for key in [key for key, window in self._windows.items() if now - window[0] > 86400]:
+            del self._windows[key]
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+class SQLiteStore:
+    """
+    Sliding-window counters in a SQLite file, shared by every worker process
+    on the host.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS rate_limit ('
+            'key TEXT PRIMARY KEY, window_start REAL, current INTEGER, previous INTEGER)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def hit(self, key, limit, period, now, count=True):
+        connection = self._connection()
+        # Take the write lock up front so read-check-write is atomic across processes
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            window = connection.execute(
+                'SELECT window_start, current, previous FROM rate_limit WHERE key = ?', (key,)
+            ).fetchone()
+            allowed, retry_after, window = _slide(list(window) if window else None, limit, period, now, count)
+            connection.execute(
+                'INSERT OR REPLACE INTO rate_limit (key, window_start, current, previous) VALUES (?, ?, ?, ?)',
+                (key, *window)
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+    def clear(self):
+        self._connection().execute('DELETE FROM rate_limit')
+
+
+def _slide(window, limit, period, now, count=True):
+    """
+    Apply one hit to a [window_start, current, previous] record. The rate is
+    estimated as the current window's count plus the previous window's count
+    weighted by how much of it still overlaps the trailing period. A rejected
+    hit is not counted, and with count=False an allowed one is not either.
+
+    Returns (allowed, seconds until a hit would be allowed, window).
+    """
+    window_start = math.floor(now / period) * period
+
+    if window is None or window[0] <= window_start - 2 * period:
+        window = [window_start, 0, 0]
+    elif window[0] < window_start:
+        window = [window_start, 0, window[1]]
+
+    overlap = 1 - (now - window_start) / period
+    if window[1] + window[2] * overlap >= limit:
+        return False, _retry_after(window, limit, period, now), window
+
+    if count:
+        window[1] += 1
+    return True, 0, window
+
+
+def _retry_after(window, limit, period, now):
+    """
+    Seconds until the estimated rate of a full window drops below limit
+    """
+    window_start, current, previous = window
+    if current < limit:
+        # The previous window's weight has to fade enough within this one
+        allowed_at = window_start + period * (1 - (limit - current) / previous)
+    else:
+        # Only once this window's hits weigh less in the next one
+        allowed_at = window_start + period * (2 - limit / current)
+    return math.floor(allowed_at - now) + 1
+
+
+def get_store():
+    """
+    The store named by RATELIMIT_STORAGE: 'memory' or 'sqlite:///path/to/file.db'
+    """
+    store = current_app.extensions.get('ratelimit')
+    if store is None:
+        storage = current_app.config.get('RATELIMIT_STORAGE', 'memory')
+        if storage.startswith('sqlite:///'):
+            store = SQLiteStore(storage[len('sqlite:///'):])
+        else:
+            store = MemoryStore()
+        current_app.extensions['ratelimit'] = store
+    return store
+
+
+def client_ip():
+    return request.remote_addr or 'unknown'
+
+
+def form_email():
+    """
+    The account being targeted, so spreading attempts over many IPs does not
+    help. Read from the form, or the JSON body of an API sign-in.
+    """
+    email = request.form.get('email')
+    data = request.get_json(silent=True) if request.is_json else None
+    if email is None and isinstance(data, dict):
+        email = data.get('email')
+    email = str(email or '').strip().lower()
+    return email or None
+
+
+def current_user_id():
+    return current_user.id if current_user.is_authenticated else None
+
+
+def count_failure():
+    """
+    Mark the current request as failed, for limits that count only failures
+    """
+    g.rate_limit_failed = True
+
+
+def _too_many_requests(retry_after):
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'success': False, 'message': 'Too many requests. Please try again later.'})
+    else:
+        response = current_app.make_response(render_template('errors/429.html', title='Too Many Requests'))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(name, limit, period, key_func=client_ip, methods=('POST',), failures_only=False):
+    """
+    Allow at most limit requests per period seconds for each key_func() value.
+    Requests over the limit get a 429 before the view runs. Only the given
+    methods count, so page loads are never throttled. With failures_only,
+    only requests the view marks with count_failure() count towards the limit.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method not in methods or not current_app.config.get('RATELIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+            key = key_func()
+            if key is None:
+                return f(*args, **kwargs)
+
+            store = get_store()
+            allowed, retry_after = store.hit(f"{name}:{key}", limit, period, time.time(), count=not failures_only)
+            if not allowed:
+                current_app.logger.warning(f"Rate limit '{name}' exceeded for {key}")
+                return _too_many_requests(retry_after)
+
+            response = f(*args, **kwargs)
+            if failures_only and g.get('rate_limit_failed'):
+                store.hit(f"{name}:{key}", limit, period, time.time())
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,153 @@
+from app import db
+from app.models.user import User, DonorProfile, HospitalProfile
+from app.models.donation import BloodInventory
+from app.utils.inventory import BLOOD_GROUPS
+from sqlalchemy import func, literal, select, union_all
+import re
+import secrets
+
+# Columns expected in a donor onboarding CSV; password is optional
+DONOR_IMPORT_FIELDS = ['name', 'email', 'age', 'gender', 'blood_group', 'weight', 'phone', 'address', 'pincode']
+
+GENDERS = ['male', 'female', 'other']
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def normalize_email(email):
+    """
+    Emails are stored and looked up lowercased; also used as a WTForms filter
+    """
+    return email.strip().lower() if email else email
+
+
+def find_taken(emails=(), license_numbers=(), phones=()):
+    """
+    Return (taken_emails, taken_license_numbers, taken_donor_phones) among the
+    given values, checked against the database in a single query. Emails are
+    normalized first; stored ones already are, so the email index is used.
+    """
+    lookups = [
+        ('email', User.email, {normalize_email(email) for email in emails}),
+        ('license', HospitalProfile.license_number, set(license_numbers)),
+        ('phone', DonorProfile.phone, set(phones)),
+    ]
+    queries = [
+        select(literal(kind).label('kind'), column.label('value')).where(column.in_(values))
+        for kind, column, values in lookups if values
+    ]
+    taken = {kind: set() for kind, column, values in lookups}
+    if not queries:
+        return taken['email'], taken['license'], taken['phone']
+
+    query = queries[0] if len(queries) == 1 else union_all(*queries)
+    for kind, value in db.session.execute(query):
+        taken[kind].add(value)
+    return taken['email'], taken['license'], taken['phone']
+
+
+def email_collisions():
+    """
+    Accounts whose emails are equal once normalized, which migration
+    a7d3e5c91b20 left mixed-case. Logins look the normalized email up, so
+    none of them can sign in until one is kept. Maps the normalized email to
+    its users.
+    """
+    normalized = func.lower(func.trim(User.email))
+    shared = db.session.query(normalized).group_by(normalized).having(func.count(User.id) > 1)
+    collisions = {}
+    for user in User.query.filter(normalized.in_(shared.scalar_subquery())).order_by(User.id).all():
+        collisions.setdefault(normalize_email(user.email), []).append(user)
+    return collisions
+
+
+def unusable_password():
+    """
+    A stored password no login can match, for accounts that must set theirs
+    through a password reset
+    """
+    return '!' + secrets.token_hex(16)
+
+
+def add_account(role, email, password_hash, profile):
+    """
+    Add a user with its profile, and a hospital's empty inventory, to the
+    session without committing
+    """
+    user = User(email=normalize_email(email), password=password_hash, role=role)
+    if role == 'donor':
+        user.donor_profile = DonorProfile(**profile)
+    elif role == 'hospital':
+        hospital_profile = HospitalProfile(**profile)
+        hospital_profile.blood_inventory = [BloodInventory(blood_group=bg, units=0) for bg in BLOOD_GROUPS]
+        user.hospital_profile = hospital_profile
+    db.session.add(user)
+    return user
+
+
+def _to_number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+
+def clean_donor_rows(rows):
+    """
+    Validate a chunk of onboarding rows one column at a time. Returns a list
+    of (account, errors) in row order, where account is a dict of profile
+    fields plus email and password, or None if the row has errors.
+    """
+    # NumPy is only needed for imports, so keep it out of startup
+    import numpy as np
+
+    rows = [{key.strip().lower(): (value or '').strip() for key, value in row.items() if key} for row in rows]
+    if not rows:
+        return []
+
+    columns = {field: np.array([row.get(field, '') for row in rows], dtype=str)
+               for field in DONOR_IMPORT_FIELDS + ['password']}
+    columns['email'] = np.char.lower(columns['email'])
+    columns['gender'] = np.char.lower(columns['gender'])
+    columns['blood_group'] = np.char.upper(columns['blood_group'])
+    ages = np.array([_to_number(value) for value in columns['age']])
+    weights = np.array([_to_number(value) for value in columns['weight']])
+
+    # Rows missing a field only report what is missing
+    missing = {field: columns[field] == '' for field in DONOR_IMPORT_FIELDS}
+    complete = ~np.logical_or.reduce(list(missing.values()))
+
+    checks = [
+        (~np.array([bool(EMAIL_PATTERN.match(email)) for email in columns['email']]), 'email is not valid'),
+        (~np.isin(columns['gender'], GENDERS), f"gender must be one of {', '.join(GENDERS)}"),
+        (~np.isin(columns['blood_group'], BLOOD_GROUPS), 'blood_group is not valid'),
+        (np.isnan(ages) | (ages != np.floor(ages)), 'age must be a whole number'),
+        ((ages < 16) | (ages > 100), 'age must be between 16 and 100'),
+        (np.isnan(weights), 'weight must be a number'),
+        (weights < 45, 'weight must be at least 45 kg'),
+        (~np.isin(np.char.str_len(columns['phone']), np.arange(10, 16)), 'phone must be 10 to 15 characters'),
+        (~np.isin(np.char.str_len(columns['address']), np.arange(5, 201)), 'address must be 5 to 200 characters'),
+        ((np.char.str_len(columns['pincode']) != 6) | ~np.char.isdigit(columns['pincode']), 'pincode must be 6 digits'),
+        (np.char.str_len(columns['name']) > 100, 'name must be at most 100 characters'),
+    ]
+
+    errors = [[] for _ in rows]
+    for field in DONOR_IMPORT_FIELDS:
+        for index in np.flatnonzero(missing[field]):
+            errors[index].append(f"{field} is required")
+    for failed, message in checks:
+        for index in np.flatnonzero(failed & complete):
+            errors[index].append(message)
+
+    results = []
+    for index in range(len(rows)):
+        if errors[index]:
+            results.append((None, errors[index]))
+            continue
+        account = {field: str(columns[field][index]) for field in DONOR_IMPORT_FIELDS}
+        account['age'] = int(ages[index])
+        account['weight'] = float(weights[index])
+        account['password'] = str(columns['password'][index]) or None
+        results.append((account, []))
+    return results
+
@@ -1,60 +1,400 @@
-from app import scheduler
+from app import scheduler, db
 from datetime import datetime, timedelta
-from flask import current_app
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.base import STATE_RUNNING, STATE_STOPPED
 from app.models.user import User, DonorProfile
-from app.models.donation import Donation
-from app.utils.sms import send_donation_reminder
-from sqlalchemy import and_
+from app.models.donation import Notification
+from app.models.job import JobState
+from app.utils.sms import send_sms, normalize_phone_number
+from app.utils.counters import bump_many, reconcile_counters, UNREAD_NOTIFICATIONS
+from app.utils.donor_summary import reconcile_donor_summaries
+from app.utils.notifications import archive_read_notifications
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from functools import wraps
+import atexit
+import os
+import socket
+import threading
+import time
 
+# Days a donor must wait between donations
+DONATION_INTERVAL_DAYS = 180
+
+# Number of reminder notifications inserted or sent per batch
+REMINDER_BATCH_SIZE = 500
+
+# Unsent reminders older than this are no longer retried
+REMINDER_RETRY_DAYS = 7
+
+# How long a worker may hold a job lock before another worker can take over
+JOB_LOCK_TTL = timedelta(minutes=30)
+
+# Identifies this process when it holds a job lock
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Lease held by the one worker allowed to run scheduled jobs
+LEADER_LEASE = 'scheduler_leader'
+
+# A leader that stops renewing is replaced once its lease expires
+LEADER_LEASE_TTL = timedelta(seconds=60)
+LEADER_LEASE_RENEW_SECONDS = 20
+
+# Application the jobs run against, set by start_scheduler. Jobs are persisted
+# in the database, so they cannot carry the app object as an argument.
+_app = None
+
+is_leader = False
+_lease_thread = None
+_stop_lease = threading.Event()
+
+
+def acquire_job_lock(name, ttl=JOB_LOCK_TTL):
+    """
+    Try to take the lock for a job. Returns True if this worker now holds it.
+    The lock expires after ttl so a crashed worker cannot block the job forever.
+    """
+    if not JobState.query.get(name):
+        try:
+            db.session.add(JobState(name=name))
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created the row first
+            db.session.rollback()
+
+    now = datetime.utcnow()
+    acquired = JobState.query.filter(
+        JobState.name == name,
+        or_(
+            JobState.locked_until.is_(None),
+            JobState.locked_until < now,
+            JobState.locked_by == WORKER_ID
+        )
+    ).update({
+        'locked_by': WORKER_ID,
+        'locked_until': now + ttl
+    }, synchronize_session=False)
+    db.session.commit()
+
+    return acquired == 1
+
+
+def release_job_lock(name):
+    """
+    Release a job lock held by this worker
+    """
+    JobState.query.filter_by(name=name, locked_by=WORKER_ID).update({
+        'locked_by': None,
+        'locked_until': None,
+        'last_run_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def enqueue_donation_reminders(now=None):
+    """
+    Queue reminders for donors who became eligible since the last run.
+
+    The watermark records the last moment fully processed, so a missed run
+    picks up every donor who became eligible in the meantime. The queued
+    notifications and the new watermark are committed together.
+    """
+    now = now or datetime.utcnow()
+    state = JobState.query.get('donation_reminders')
+    # On the first run only look back one day, as the old daily check did
+    since = state.watermark or now - timedelta(days=1)
+
+    interval = timedelta(days=DONATION_INTERVAL_DAYS)
+
+    # Range scan on the last_donation_date index
+    eligible_donors = db.session.query(DonorProfile.user_id, DonorProfile.name).join(
+        User, User.id == DonorProfile.user_id
+    ).filter(
+        User.role == 'donor',
+        DonorProfile.donation_reminders == True,
+        DonorProfile.last_donation_date > since - interval,
+        DonorProfile.last_donation_date <= now - interval
+    ).all()
+
+    reminders = [{
+        'user_id': user_id,
+        'title': 'Donation Eligibility Reminder',
+        'message': f"Hello {name}, good news! It's been {DONATION_INTERVAL_DAYS} days since your last blood donation. You are now eligible to donate again. Please consider donating to save lives!",
+        'notification_type': 'donation_reminder',
+        'delivery_method': 'sms',
+        'is_sent': False,
+        'is_read': False,
+        'created_at': now
+    } for user_id, name in eligible_donors]
+
+    for start in range(0, len(reminders), REMINDER_BATCH_SIZE):
+        db.session.bulk_insert_mappings(Notification, reminders[start:start + REMINDER_BATCH_SIZE])
+
+    # Bulk inserts skip the ORM hooks that maintain unread counters
+    bump_many(UNREAD_NOTIFICATIONS, {user_id: 1 for user_id, name in eligible_donors})
+
+    state.watermark = now
+    db.session.commit()
+
+    return len(reminders)
+
+
+def dispatch_donation_reminders(now=None):
+    """
+    Send queued reminder SMS in batches. Failed sends stay queued and are
+    retried on later runs until they are REMINDER_RETRY_DAYS old.
+    """
+    now = now or datetime.utcnow()
+    sent = failed = 0
+    last_id = 0
+
+    while True:
+        batch = db.session.query(Notification.id, Notification.message, DonorProfile.phone).join(
+            DonorProfile, DonorProfile.user_id == Notification.user_id
+        ).filter(
+            Notification.notification_type == 'donation_reminder',
+            Notification.delivery_method == 'sms',
+            Notification.is_sent == False,
+            Notification.created_at >= now - timedelta(days=REMINDER_RETRY_DAYS),
+            Notification.id > last_id
+        ).order_by(Notification.id).limit(REMINDER_BATCH_SIZE).all()
+
+        if not batch:
+            break
+
+        sent_ids = []
+        for notification_id, message, phone in batch:
+            success, result = send_sms(normalize_phone_number(phone), message)
+            if success:
+                sent_ids.append(notification_id)
+            else:
+                failed += 1
+                _app.logger.error(f"Failed to send donation reminder {notification_id}: {result}")
+
+        if sent_ids:
+            Notification.query.filter(Notification.id.in_(sent_ids)).update({
+                'is_sent': True,
+                'sent_at': datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+            sent += len(sent_ids)
+
+        last_id = batch[-1][0]
+
+    return sent, failed
+
+
+def scheduled_job(name):
+    """
+    Run a job inside the application context while holding its lock,
+    and record how long it took on its JobState row
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function():
+            with _app.app_context():
+                if not acquire_job_lock(name):
+                    _app.logger.info(f"Job {name} is running in another worker, skipping")
+                    return
+
+                started = time.monotonic()
+                error = None
+                try:
+                    f()
+                except Exception as e:
+                    error = e
+                    _app.logger.error(f"Job {name} failed: {str(e)}")
+                finally:
+                    db.session.rollback()
+                    record_job_run(name, time.monotonic() - started, error)
+                    release_job_lock(name)
+        return decorated_function
+    return decorator
+
+
+def record_job_run(name, duration, error=None):
+    """
+    Update run count, failure count and duration metrics for a job
+    """
+    values = {
+        'run_count': JobState.run_count + 1,
+        'total_duration': JobState.total_duration + duration,
+        'last_duration': duration
+    }
+    if error is not None:
+        values['failure_count'] = JobState.failure_count + 1
+        values['last_error'] = str(error)[:200]
+
+    JobState.query.filter_by(name=name).update(values, synchronize_session=False)
+    db.session.commit()
+
+
+@scheduled_job('donation_reminders')
 def check_donation_reminders():
     """
-    Check for donors who are eligible to donate again (180 days since last donation)
-    and send them reminders
-    """
-    with current_app.app_context():
-        # Find donors whose last donation was 180 days ago
-        six_months_ago = datetime.utcnow() - timedelta(days=180)
-        
-        # Find donations that were approved exactly 180 days ago
-        recent_eligible_donations = Donation.query.filter(
-            and_(
-                Donation.status == 'approved',
-                Donation.approval_date <= six_months_ago,
-                Donation.approval_date >= six_months_ago - timedelta(days=1)  # Within the last day of becoming eligible
-            )
-        ).all()
-        
-        for donation in recent_eligible_donations:
-            # Send reminder to donor
-            send_donation_reminder(donation.donor_id)
-            current_app.logger.info(f"Sent donation reminder to donor ID: {donation.donor_id}")
+    Queue and send reminders to donors who are eligible to donate again
+    (180 days since last donation)
+    """
+    queued = enqueue_donation_reminders()
+    sent, failed = dispatch_donation_reminders()
+    _app.logger.info(f"Donation reminders: {queued} queued, {sent} sent, {failed} failed")
 
 
-def start_scheduler(app):
+@scheduled_job('shortage_forecast')
+def run_shortage_forecast():
+    """
+    Refresh shortage forecasts from the day's inventory and donation history
+    and broadcast requests for blood groups that are about to run out
     """
-    Start the background scheduler for automated tasks
-    """
-    if not scheduler.running:
-        with app.app_context():
-            # Add scheduled jobs
-            scheduler.add_job(
-                func=check_donation_reminders,
-                trigger='interval',
-                hours=24,  # Run once a day
-                id='donation_reminder_job',
-                replace_existing=True
-            )
-            
-            # Start the scheduler
+    from app.utils.forecast import update_shortage_forecasts, send_shortage_alerts
+
+    series = update_shortage_forecasts()
+    alerts = send_shortage_alerts()
+    _app.logger.info(f"Shortage forecast updated for {series} series, {alerts} alerts sent")
+
+
+@scheduled_job('counter_reconciliation')
+def run_counter_reconciliation():
+    """
+    Repair any drift between badge counters and donor summaries and the rows
+    they count
+    """
+    corrected = reconcile_counters()
+    if corrected:
+        _app.logger.warning(f"Counter reconciliation corrected {corrected} counters")
+    corrected = reconcile_donor_summaries()
+    if corrected:
+        _app.logger.warning(f"Counter reconciliation corrected {corrected} donor summaries")
+
+
+@scheduled_job('notification_retention')
+def run_notification_retention():
+    """
+    Move old read notifications to the archive table
+    """
+    archived = archive_read_notifications()
+    _app.logger.info(f"Notification retention archived {archived} notifications")
+
+
+def _add_jobs():
+    # Keep job definitions in the application database so the next leader
+    # resumes the same schedule
+    scheduler.add_jobstore(SQLAlchemyJobStore(engine=db.engine), 'default')
+
+    scheduler.add_job(
+        func=check_donation_reminders,
+        trigger='interval',
+        hours=1,  # Each run only processes donors who became eligible since the last one
+        id='donation_reminder_job',
+        replace_existing=True,
+        coalesce=True
+    )
+
+    scheduler.add_job(
+        func=run_shortage_forecast,
+        trigger='cron',
+        hour=1,
+        minute=30,  # Run nightly after the day's donations are in
+        id='shortage_forecast_job',
+        replace_existing=True,
+        coalesce=True
+    )
+
+    scheduler.add_job(
+        func=run_counter_reconciliation,
+        trigger='interval',
+        hours=6,
+        id='counter_reconciliation_job',
+        replace_existing=True,
+        coalesce=True
+    )
+
+    scheduler.add_job(
+        func=run_notification_retention,
+        trigger='cron',
+        hour=2,
+        minute=30,
+        id='notification_retention_job',
+        replace_existing=True,
+        coalesce=True
+    )
+
+
+def _become_leader():
+    global is_leader
+
+    is_leader = True
+    if scheduler.state == STATE_STOPPED:
+        with _app.app_context():
+            _add_jobs()
             scheduler.start()
-            app.logger.info("Background scheduler started")
-            
-            # Shut down scheduler when app context ends
-            def shutdown_scheduler(exception):
-                try:
-                    if scheduler.running:
-                        scheduler.shutdown(wait=False)
-                except:
-                    pass
-                
-            app.teardown_appcontext(shutdown_scheduler)
+    else:
+        scheduler.resume()
+    _app.logger.info(f"Worker {WORKER_ID} is now the scheduler leader")
+
+
+def _step_down():
+    global is_leader
+
+    is_leader = False
+    if scheduler.state == STATE_RUNNING:
+        scheduler.pause()
+    _app.logger.warning(f"Worker {WORKER_ID} lost the scheduler lease, jobs paused")
+
+
+def _lease_loop():
+    """
+    Keep trying to take or renew the leader lease. Only the worker holding it
+    runs scheduled jobs; if the leader dies its lease expires and another
+    worker takes over on its next attempt.
+    """
+    while not _stop_lease.is_set():
+        with _app.app_context():
+            try:
+                leader = acquire_job_lock(LEADER_LEASE, ttl=LEADER_LEASE_TTL)
+            except Exception as e:
+                # Without a confirmed lease this worker must not run jobs
+                _app.logger.error(f"Error renewing scheduler lease: {str(e)}")
+                db.session.rollback()
+                leader = False
+            finally:
+                db.session.remove()
+
+        if leader and not is_leader:
+            _become_leader()
+        elif not leader and is_leader:
+            _step_down()
+
+        _stop_lease.wait(LEADER_LEASE_RENEW_SECONDS)
+
+
+def start_scheduler(app):
+    """
+    Start leader election for the background scheduler. Every worker runs the
+    election, but only the current leader starts the scheduler and runs jobs.
+    """
+    global _app, _lease_thread, WORKER_ID
+
+    if _lease_thread is not None:
+        return
+
+    _app = app
+    # Workers forked from a preloaded app share the import-time pid
+    WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+    _lease_thread = threading.Thread(target=_lease_loop, name='scheduler-lease', daemon=True)
+    _lease_thread.start()
+    app.logger.info(f"Scheduler leader election started for worker {WORKER_ID}")
+
+    # Stop the scheduler and hand the lease over when the process exits
+    def shutdown_scheduler():
+        _stop_lease.set()
+        try:
+            if scheduler.running:
+                scheduler.shutdown(wait=False)
+            if is_leader:
+                with _app.app_context():
+                    release_job_lock(LEADER_LEASE)
+        except:
+            pass
+
+    atexit.register(shutdown_scheduler)
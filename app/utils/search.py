@@ -0,0 +1,225 @@
+from app import db
+from app.models.user import User, DonorProfile, HospitalProfile
+from app.models.donation import Donation
+from sqlalchemy import column, event, func, inspect, literal_column, select, table
+import re
+
+# Words of a query that are matched, each as a prefix
+MAX_SEARCH_TERMS = 8
+
+# Results returned to a typeahead
+TYPEAHEAD_LIMIT = 10
+
+# One full-text table per kind, keyed by rowid: the donor's user id, the
+# hospital profile id or the donation id. SQLite uses FTS5 with prefix
+# indexes so typeahead stays fast; other databases (PostgreSQL) use a
+# generated tsvector column with a GIN index.
+SEARCH_TABLES = {
+    'donor': table('donor_search', column('rowid'), column('body')),
+    'hospital': table('hospital_search', column('rowid'), column('body')),
+    'donation': table('donation_search', column('rowid'), column('body'), column('hospital_id')),
+}
+
+_SQLITE_DDL = "CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5(body{extra}, " \
+              "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+
+_POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS {name} (rowid integer PRIMARY KEY, body text NOT NULL{extra}, "
+    "document tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_{name}_document ON {name} USING gin (document)",
+]
+
+
+def _is_sqlite(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+def _donor_documents():
+    return select(User.id, DonorProfile.name + ' ' + User.email + ' ' + DonorProfile.phone).join(
+        DonorProfile, DonorProfile.user_id == User.id
+    )
+
+
+def _hospital_documents():
+    return select(HospitalProfile.id, HospitalProfile.name + ' ' + HospitalProfile.address)
+
+
+def _donation_documents():
+    return select(Donation.id, Donation.notes, Donation.hospital_id).where(
+        Donation.notes.isnot(None), Donation.notes != ''
+    )
+
+
+_DOCUMENTS = {
+    'donor': (_donor_documents, User.id),
+    'hospital': (_hospital_documents, HospitalProfile.id),
+    'donation': (_donation_documents, Donation.id),
+}
+
+
+def reindex(connection, kind, ids=None):
+    """
+    Rebuild the search documents of the given ids (all if None) from the
+    source tables, within the caller's transaction
+    """
+    search_table = SEARCH_TABLES[kind]
+    documents, key = _DOCUMENTS[kind]
+    documents = documents()
+    if ids is None:
+        connection.execute(search_table.delete())
+    else:
+        ids = list(ids)
+        if not ids:
+            return
+        connection.execute(search_table.delete().where(search_table.c.rowid.in_(ids)))
+        documents = documents.where(key.in_(ids))
+    connection.execute(search_table.insert().from_select(list(search_table.c.keys()), documents))
+
+
+def unindex(connection, kind, entity_id):
+    search_table = SEARCH_TABLES[kind]
+    connection.execute(search_table.delete().where(search_table.c.rowid == entity_id))
+
+
+def create_search_tables(connection):
+    """
+    Create the search tables that are missing and index existing rows into
+    them. Returns the kinds that were created.
+    """
+    existing = set(inspect(connection).get_table_names())
+    created = []
+    for kind, search_table in SEARCH_TABLES.items():
+        if search_table.name in existing:
+            continue
+        if _is_sqlite(connection):
+            extra = ', hospital_id UNINDEXED' if kind == 'donation' else ''
+            connection.exec_driver_sql(_SQLITE_DDL.format(name=search_table.name, extra=extra))
+        else:
+            extra = ', hospital_id integer' if kind == 'donation' else ''
+            for ddl in _POSTGRES_DDL:
+                connection.exec_driver_sql(ddl.format(name=search_table.name, extra=extra))
+        reindex(connection, kind)
+        created.append(kind)
+    return created
+
+
+def _terms(query):
+    return re.findall(r'\w+', (query or '').lower())[:MAX_SEARCH_TERMS]
+
+
+def search_ids(kind, query, hospital_id=None, limit=None):
+    """
+    A select of the ids matching every word of query as a prefix, for use in
+    an IN clause, or None if the query has no words. Donations can be limited
+    to one hospital's.
+    """
+    terms = _terms(query)
+    if not terms:
+        return None
+
+    search_table = SEARCH_TABLES[kind]
+    if _is_sqlite(db.session.get_bind()):
+        # Words are quoted so FTS5 syntax in the input is matched literally
+        condition = literal_column(search_table.name).op('MATCH')(' '.join(f'"{term}"*' for term in terms))
+    else:
+        condition = literal_column('document').op('@@')(
+            func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+        )
+
+    ids = select(search_table.c.rowid).where(condition)
+    if hospital_id is not None:
+        ids = ids.where(search_table.c.hospital_id == hospital_id)
+    if limit is not None:
+        ids = ids.limit(limit)
+    return ids
+
+
+def typeahead(kind, query, limit=TYPEAHEAD_LIMIT):
+    """
+    Up to limit donors or hospitals matching query, as dicts for a JSON response
+    """
+    ids = search_ids(kind, query, limit=limit)
+    if ids is None:
+        return []
+
+    ids = db.session.execute(ids).scalars().all()
+    if kind == 'donor':
+        rows = db.session.query(User.id, DonorProfile.name, User.email, DonorProfile.blood_group).join(
+            DonorProfile, DonorProfile.user_id == User.id
+        ).filter(User.id.in_(ids)).all()
+        return [{'id': user_id, 'label': name, 'detail': f"{email} · {blood_group}"}
+                for user_id, name, email, blood_group in rows]
+
+    rows = db.session.query(HospitalProfile.id, HospitalProfile.name, HospitalProfile.address).filter(
+        HospitalProfile.id.in_(ids)
+    ).all()
+    return [{'id': hospital_id, 'label': name, 'detail': address} for hospital_id, name, address in rows]
+
+
+# Keep the search tables in step with ORM writes. Core bulk inserts (the
+# roster importer) call reindex themselves.
+
+def _changed(target, *attributes):
+    state = inspect(target)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+@event.listens_for(DonorProfile, 'after_insert')
+def _donor_profile_inserted(mapper, connection, target):
+    reindex(connection, 'donor', [target.user_id])
+
+
+@event.listens_for(DonorProfile, 'after_update')
+def _donor_profile_updated(mapper, connection, target):
+    if _changed(target, 'name', 'phone', 'user_id'):
+        reindex(connection, 'donor', [target.user_id])
+
+
+@event.listens_for(DonorProfile, 'after_delete')
+def _donor_profile_deleted(mapper, connection, target):
+    unindex(connection, 'donor', target.user_id)
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    if target.role == 'donor' and _changed(target, 'email'):
+        reindex(connection, 'donor', [target.id])
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    if target.role == 'donor':
+        unindex(connection, 'donor', target.id)
+
+
+@event.listens_for(HospitalProfile, 'after_insert')
+def _hospital_inserted(mapper, connection, target):
+    reindex(connection, 'hospital', [target.id])
+
+
+@event.listens_for(HospitalProfile, 'after_update')
+def _hospital_updated(mapper, connection, target):
+    if _changed(target, 'name', 'address'):
+        reindex(connection, 'hospital', [target.id])
+
+
+@event.listens_for(HospitalProfile, 'after_delete')
+def _hospital_deleted(mapper, connection, target):
+    unindex(connection, 'hospital', target.id)
+
+
+@event.listens_for(Donation, 'after_insert')
+def _donation_inserted(mapper, connection, target):
+    if target.notes:
+        reindex(connection, 'donation', [target.id])
+
+
+@event.listens_for(Donation, 'after_update')
+def _donation_updated(mapper, connection, target):
+    if _changed(target, 'notes', 'hospital_id'):
+        reindex(connection, 'donation', [target.id])
+
+
+@event.listens_for(Donation, 'after_delete')
+def _donation_deleted(mapper, connection, target):
+    unindex(connection, 'donation', target.id)
@@ -1,8 +1,9 @@
-from twilio.rest import Client
 import os
 from app.models.user import User, DonorProfile
 from app.models.donation import Notification
 from app import db
+from app.utils.events import publish_notification_delta
+from app.utils.write_queue import run_write
 from datetime import datetime
 from flask import current_app
 
@@ -28,7 +29,8 @@ def send_sms(to_number, message):
         current_app.logger.info(f"Attempting to send SMS to: {to_number}")
         current_app.logger.info(f"From number: {from_number}")
         
-        # Initialize Twilio client
+        # Initialize Twilio client, imported here to keep it out of startup
+        from twilio.rest import Client
         client = Client(account_sid, auth_token)
         
         # Send message
@@ -49,9 +51,19 @@ def send_sms(to_number, message):
         return False, str(e)
 
 
-def send_blood_request_notification(hospital_id, blood_group, quantity):
+def normalize_phone_number(phone_number):
     """
-    Send SMS to eligible donors when a hospital requests blood
+    Add the India country code to numbers stored without one
+    """
+    if not phone_number.startswith('+'):
+        phone_number = '+91' + phone_number.lstrip('0')
+    return phone_number
+
+
+def send_blood_request_notification(hospital_id, blood_group, quantity, donors=None):
+    """
+    Send SMS to eligible donors when a hospital requests blood. By default
+    every donor of the blood group is asked; pass donors to text only those.
     """
     from app.models.user import User, DonorProfile, HospitalProfile
     
@@ -62,39 +74,27 @@ def send_blood_request_notification(hospital_id, blood_group, quantity):
         return 0, 0
     
     # Find eligible donors with matching blood group
-    eligible_donors = User.query.join(DonorProfile).filter(
-        User.role == 'donor',
-        DonorProfile.blood_group == blood_group
-    ).all()
+    if donors is not None:
+        eligible_donors = donors
+    else:
+        eligible_donors = User.query.join(DonorProfile).filter(
+            User.role == 'donor',
+            DonorProfile.blood_group == blood_group
+        ).all()
     
     success_count = 0
     failed_count = 0
+    sent_at = {}  # donor id -> when the SMS went out, or None if it failed
+    
+    # Message for every eligible donor
+    message = f"URGENT: {hospital.name} needs {quantity} units of {blood_group} blood. Please contact {hospital.phone} or check your account for details."
     
+    # Text donors before writing anything, so no write transaction is held
+    # open while waiting on Twilio
     for donor in eligible_donors:
         # Check if donor is eligible
         if donor.donor_profile and donor.donor_profile.is_eligible()[0]:
-            # Create a more detailed message
-            message = f"URGENT: {hospital.name} needs {quantity} units of {blood_group} blood. Please contact {hospital.phone} or check your account for details."
-            
-            # Create notification in system
-            notification = Notification(
-                user_id=donor.id,
-                title="Urgent Blood Request",
-                message=message,
-                notification_type='blood_request',
-                delivery_method='sms',
-                related_entity_type='hospital',
-                related_entity_id=hospital_id
-            )
-            db.session.add(notification)
-            
-            # Get the donor's phone number
-            phone_number = donor.donor_profile.phone
-            
-            # Ensure phone number is properly formatted
-            if not phone_number.startswith('+'):
-                # Add India country code if not present
-                phone_number = '+91' + phone_number.lstrip('0')
+            phone_number = normalize_phone_number(donor.donor_profile.phone)
             
             # Send SMS
             current_app.logger.info(f"Sending SMS to {phone_number}")
@@ -104,18 +104,38 @@ def send_blood_request_notification(hospital_id, blood_group, quantity):
             )
             
             if success:
-                notification.is_sent = True
-                notification.sent_at = datetime.utcnow()
+                sent_at[donor.id] = datetime.utcnow()
                 success_count += 1
                 current_app.logger.info(f"Successfully sent SMS to {phone_number}, SID: {message_result}")
             else:
+                sent_at[donor.id] = None
                 failed_count += 1
                 current_app.logger.error(f"Failed to send SMS to {phone_number}: {message_result}")
     
-    db.session.commit()
+    # Record a notification in the system for each donor in one write
+    run_write(_add_blood_request_notifications, sent_at, message, hospital_id)
+    
+    for donor_id in sent_at:
+        publish_notification_delta(donor_id)
+    
     return success_count, failed_count
 
 
+def _add_blood_request_notifications(sent_at, message, hospital_id):
+    for donor_id, sent in sent_at.items():
+        db.session.add(Notification(
+            user_id=donor_id,
+            title="Urgent Blood Request",
+            message=message,
+            notification_type='blood_request',
+            delivery_method='sms',
+            is_sent=sent is not None,
+            sent_at=sent,
+            related_entity_type='hospital',
+            related_entity_id=hospital_id
+        ))
+
+
 def send_donation_reminder(donor_id):
     """
     Send reminder to donor that they are eligible to donate again
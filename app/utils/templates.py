@@ -0,0 +1,56 @@
+from jinja2 import FileSystemBytecodeCache, TemplateError
+import os
+import stat
+import time
+
+
+def _check_private(directory):
+    """
+    Create directory, or check an existing one, as only the app's user may
+    write to it. Cached bytecode is loaded with marshal and run, so anyone
+    able to write there could run code in the app.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        return
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) != stat.S_IRWXU:
+        raise RuntimeError(f"TEMPLATE_CACHE_DIR {directory} must be a directory owned by uid {os.getuid()} "
+                           f"with mode 0700")
+
+
+def configure_bytecode_cache(app):
+    """
+    Store compiled templates in TEMPLATE_CACHE_DIR, so a new worker loads
+    them instead of compiling each on its first use. Unset, Jinja picks a
+    per-user directory under the temp dir and checks it itself. Must run
+    before the Jinja environment is first used.
+    """
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if directory == '':
+        return
+    if directory is None:
+        cache = FileSystemBytecodeCache()
+    else:
+        _check_private(directory)
+        cache = FileSystemBytecodeCache(directory)
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=cache)
+
+
+def precompile_templates(app):
+    """
+    Compile every template, writing its bytecode to the cache. Entries are
+    keyed by a checksum of the source, so edited templates are compiled again
+    and stale entries are never used. Returns (compiled, errors, seconds),
+    where errors maps template names to messages.
+    """
+    started = time.perf_counter()
+    compiled, errors = 0, {}
+    for name in app.jinja_env.list_templates(extensions=('html',)):
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateError as e:
+            errors[name] = str(e)
+        else:
+            compiled += 1
+    return compiled, errors, time.perf_counter() - started
@@ -0,0 +1,262 @@
+from app import db
+from app.models.user import DonorProfile, HospitalProfile, invalidate_user
+from app.models.donation import Donation, BloodInventory, Notification, DonorSummary
+from app.utils.counters import bump_many, PENDING_DONATIONS, UNREAD_NOTIFICATIONS
+from app.utils.donor_summary import adjust
+from app.utils.events import publish_notification_delta, publish_pending_delta
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy import bindparam, event, select, tuple_
+from sqlalchemy.orm import Session
+
+# Notification sent to the donor when a hospital moves their donation to a
+# status: (title, notification type, message). Donors are told about their
+# own cancellations by the cancel view, which also emails them.
+NOTIFICATIONS = {
+    'approved': ('Donation Request Approved', 'donation_approved',
+                 'Your blood donation request has been approved by {hospital}. Thank you for saving lives!'),
+    'rejected': ('Donation Request Rejected', 'donation_rejected',
+                 'Your donation request to {hospital} has been rejected.'),
+    'completed': ('Donation Completed', 'donation_completed',
+                  'Your donation at {hospital} has been marked as completed. Thank you for your contribution!'),
+}
+
+_hooks = defaultdict(list)
+
+
+def on_transition(*statuses):
+    """
+    Register a hook run, within the transaction, once per batch of donations
+    moved to one of statuses. Hooks are called as hook(donations, context),
+    where donations may be Donation instances or rows with the same columns,
+    and should change other tables with set-based statements.
+    """
+    def decorator(f):
+        for status in statuses:
+            _hooks[status].append(f)
+        return f
+    return decorator
+
+
+class TransitionContext:
+    """
+    What the hooks of one batch share: the time of the transition, the
+    hospitals involved and the effects to apply once the transaction commits
+    """
+
+    def __init__(self, status, at, hospitals):
+        self.status = status
+        self.at = at
+        self.hospitals = hospitals  # hospital profile id -> (name, user id)
+        self.effects = _effects(db.session)
+
+    def hospital_name(self, hospital_id):
+        return self.hospitals.get(hospital_id, ('the hospital', None))[0]
+
+
+def _effects(session):
+    """
+    Side effects waiting for the session's transaction to commit, applied
+    once per commit however many transitions it holds
+    """
+    return session.info.setdefault('donation_transition_effects', {
+        'pending': Counter(),  # hospital user id -> change in pending requests
+        'notifications': Counter(),  # user id -> new unread notifications
+        'users': set(),  # users whose cached identity is stale
+    })
+
+
+def _context(status, at, donations):
+    hospital_ids = {donation.hospital_id for donation in donations if donation.hospital_id is not None}
+    hospitals = {}
+    if hospital_ids:
+        hospitals = {hospital_id: (name, user_id) for hospital_id, name, user_id in db.session.query(
+            HospitalProfile.id, HospitalProfile.name, HospitalProfile.user_id
+        ).filter(HospitalProfile.id.in_(hospital_ids)).all()}
+
+    context = TransitionContext(status, at, hospitals)
+    for donation in donations:
+        if donation.status == 'pending' and donation.hospital_id in hospitals:
+            context.effects['pending'][hospitals[donation.hospital_id][1]] -= 1
+    return context
+
+
+def _run_hooks(donations, context):
+    for hook in _hooks[context.status]:
+        hook(donations, context)
+
+
+def transition(donations, status, at=None):
+    """
+    Move loaded donations to status within the current transaction and run
+    the status's hooks once for the whole batch. Donations that cannot make
+    the transition (already processed) are skipped. Returns the ones moved.
+    """
+    at = at or datetime.utcnow()
+    moved = [donation for donation in donations if donation.can_transition(status)]
+    if not moved:
+        return []
+
+    context = _context(status, at, moved)
+    for donation in moved:
+        donation.transition(status, at)
+    _run_hooks(moved, context)
+    return moved
+
+
+def bulk_transition(status, donation_ids=None, hospital_id=None, donor_id=None, filters=(), limit=None, at=None):
+    """
+    Move many donations to status with set-based statements, without loading
+    them into the session: the given ids, or else every donation matching
+    filters that can make the transition (at most limit, oldest first).
+    Either way only one hospital's or one donor's donations are touched.
+
+    Returns {donation id: (outcome, status)}: 'moved' with the new status,
+    'skipped' with the status that did not allow it, or 'not_found'.
+    """
+    at = at or datetime.utcnow()
+    sources, date_column = Donation.TRANSITIONS[status]
+
+    query = db.session.query(
+        Donation.id, Donation.donor_id, Donation.hospital_id, Donation.blood_group, Donation.units, Donation.status
+    )
+    if hospital_id is not None:
+        query = query.filter(Donation.hospital_id == hospital_id)
+    if donor_id is not None:
+        query = query.filter(Donation.donor_id == donor_id)
+    if donation_ids is not None:
+        donation_ids = list(donation_ids)
+        query = query.filter(Donation.id.in_(donation_ids))
+    else:
+        query = query.filter(Donation.status.in_(sources), *filters).order_by(Donation.id)
+        if limit is not None:
+            query = query.limit(limit)
+
+    # Lock the rows so the update below changes exactly the ones classified here
+    rows = query.with_for_update().all()
+
+    outcomes = {donation_id: ('not_found', None) for donation_id in donation_ids or ()}
+    moved = []
+    for row in rows:
+        if row.status in sources:
+            moved.append(row)
+            outcomes[row.id] = ('moved', status)
+        else:
+            outcomes[row.id] = ('skipped', row.status)
+    if not moved:
+        return outcomes
+
+    context = _context(status, at, moved)
+    db.session.execute(Donation.__table__.update().where(
+        Donation.__table__.c.id.in_([row.id for row in moved])
+    ).values({'status': status, date_column: at}))
+
+    # The Donation events that keep badge counters and donor summaries in step
+    # do not see Core updates, so apply their changes here
+    pending = Counter(row.hospital_id for row in moved if row.status == 'pending' and row.hospital_id is not None)
+    bump_many(PENDING_DONATIONS, {hospital: -count for hospital, count in pending.items()})
+    if status == 'completed':
+        completed, units = Counter(), Counter()
+        for row in moved:
+            completed[row.donor_id] += 1
+            units[row.donor_id] += row.units
+        connection = db.session.connection()
+        for donor, count in completed.items():
+            adjust(connection, donor, 0, count, units[donor])
+
+    _run_hooks(moved, context)
+    return outcomes
+
+
+@on_transition('approved')
+def _credit_inventory(donations, context):
+    """
+    Add approved units to stock with one statement per batch for existing
+    rows and one for new ones
+    """
+    units = Counter()
+    for donation in donations:
+        if donation.hospital_id is not None:
+            units[(donation.hospital_id, donation.blood_group)] += donation.units
+    if not units:
+        return
+
+    inventory = BloodInventory.__table__
+    existing = {tuple(row) for row in db.session.execute(
+        select(inventory.c.hospital_id, inventory.c.blood_group).where(
+            tuple_(inventory.c.hospital_id, inventory.c.blood_group).in_(list(units))
+        )
+    )}
+
+    updates = [{'h': hospital_id, 'g': blood_group, 'added': added}
+               for (hospital_id, blood_group), added in units.items() if (hospital_id, blood_group) in existing]
+    if updates:
+        db.session.execute(inventory.update().where(
+            inventory.c.hospital_id == bindparam('h'),
+            inventory.c.blood_group == bindparam('g')
+        ).values(units=inventory.c.units + bindparam('added'), last_updated=context.at), updates)
+
+    # Create new inventory entries where a group had none
+    inserts = [{'hospital_id': hospital_id, 'blood_group': blood_group, 'units': added, 'last_updated': context.at}
+               for (hospital_id, blood_group), added in units.items() if (hospital_id, blood_group) not in existing]
+    if inserts:
+        db.session.execute(inventory.insert(), inserts)
+
+
+@on_transition('approved', 'completed')
+def _record_donation_date(donations, context):
+    """
+    Start each donor's deferral period from the transition. The next eligible
+    date follows from it (DonorSummary.next_eligible_date).
+    """
+    donor_ids = list({donation.donor_id for donation in donations})
+    db.session.execute(DonorProfile.__table__.update().where(
+        DonorProfile.__table__.c.user_id.in_(donor_ids)
+    ).values(last_donation_date=context.at))
+    # Mirror it into the summaries, which the profile events would otherwise do
+    db.session.execute(DonorSummary.__table__.update().where(
+        DonorSummary.__table__.c.donor_id.in_(donor_ids)
+    ).values(last_donation_date=context.at))
+    context.effects['users'].update(donor_ids)
+
+
+@on_transition(*NOTIFICATIONS)
+def _notify_donors(donations, context):
+    """
+    Insert the donors' notifications in one statement and bump their unread
+    counters, which the ORM events would otherwise do row by row
+    """
+    title, notification_type, message = NOTIFICATIONS[context.status]
+    db.session.execute(Notification.__table__.insert(), [{
+        'user_id': donation.donor_id,
+        'title': title,
+        'message': message.format(hospital=context.hospital_name(donation.hospital_id)),
+        'notification_type': notification_type,
+        'delivery_method': 'system',
+        'related_entity_type': 'donation',
+        'related_entity_id': donation.id,
+    } for donation in donations])
+
+    added = Counter(donation.donor_id for donation in donations)
+    bump_many(UNREAD_NOTIFICATIONS, added)
+    context.effects['notifications'].update(added)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_effects(session):
+    effects = session.info.pop('donation_transition_effects', None)
+    if not effects:
+        return
+
+    for user_id in effects['users']:
+        invalidate_user(user_id)
+    for hospital_user_id, delta in effects['pending'].items():
+        if delta:
+            publish_pending_delta(hospital_user_id, delta)
+    for user_id, delta in effects['notifications'].items():
+        publish_notification_delta(user_id, delta)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_effects(session):
+    session.info.pop('donation_transition_effects', None)
@@ -0,0 +1,115 @@
+from flask import current_app
+from app import db
+from app.session import stick_to_primary
+from concurrent.futures import Future
+from threading import Lock, Thread
+import queue
+
+# Writes committed together in one transaction at most
+MAX_GROUP_SIZE = 64
+
+# Seconds a request waits for its write before giving up
+WRITE_TIMEOUT = 30
+
+_start_lock = Lock()
+
+
+class WriteQueue:
+    """
+    Serializes SQLite writes from all threads onto one writer thread.
+
+    SQLite allows a single writer at a time, so threads that each commit
+    their own small transaction queue up on the database lock and, past the
+    busy timeout, fail with 'database is locked'. Here writes are handed to
+    one thread which runs whatever has queued up (up to MAX_GROUP_SIZE) in a
+    single transaction and commits once. If the group fails its writes are
+    retried one transaction each, so one bad write only fails its own caller.
+    """
+
+    def __init__(self, app, max_group_size=MAX_GROUP_SIZE):
+        self.app = app
+        self.max_group_size = max_group_size
+        self.jobs = queue.Queue()
+        self.groups = 0
+        self.thread = Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self.jobs.put((future, func, args, kwargs))
+        return future
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                group = [self.jobs.get()]
+                while len(group) < self.max_group_size:
+                    try:
+                        group.append(self.jobs.get_nowait())
+                    except queue.Empty:
+                        break
+                group = [job for job in group if job[0].set_running_or_notify_cancel()]
+                if group:
+                    self._commit_group(group)
+                db.session.remove()
+
+    def _commit_group(self, group):
+        try:
+            results = [func(*args, **kwargs) for future, func, args, kwargs in group]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(group) == 1:
+                group[0][0].set_exception(e)
+            else:
+                # Find the failing write by committing each on its own
+                for job in group:
+                    self._commit_group([job])
+            return
+
+        self.groups += 1
+        for (future, func, args, kwargs), result in zip(group, results):
+            future.set_result(result)
+
+
+def get_write_queue():
+    """
+    The app's write queue, started on first use, or None if writes should be
+    committed directly (the queue is off or the database is not SQLite)
+    """
+    if not current_app.config.get('SQLITE_WRITE_QUEUE') or db.engine.dialect.name != 'sqlite':
+        return None
+
+    write_queue = current_app.extensions.get('sqlite_write_queue')
+    if write_queue is None:
+        with _start_lock:
+            write_queue = current_app.extensions.get('sqlite_write_queue')
+            if write_queue is None:
+                # Started lazily so each forked worker gets its own writer thread
+                write_queue = WriteQueue(current_app._get_current_object())
+                current_app.extensions['sqlite_write_queue'] = write_queue
+    return write_queue
+
+
+def run_write(func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs), which makes changes through db.session without
+    committing, and commit them. On SQLite with the write queue on, it runs on
+    the writer thread in a group commit, so it must load what it changes by id
+    rather than use objects from the caller's session. Returns func's result
+    and raises its exception.
+    """
+    write_queue = get_write_queue()
+    if write_queue is None:
+        try:
+            result = func(*args, **kwargs)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result
+
+    result = write_queue.submit(func, *args, **kwargs).result(timeout=WRITE_TIMEOUT)
+    # Committed on the writer thread, so this request's session did not see it
+    stick_to_primary()
+    return result
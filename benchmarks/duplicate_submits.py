@@ -0,0 +1,109 @@
+"""
+Concurrent submits of the donation request form by one donor.
+
+Each round releases --threads logged-in clients at once at the request
+endpoint for a new hospital, first all carrying the same idempotency key (a
+retried or double-clicked form), then each with its own key (the form open
+in several tabs):
+
+    python benchmarks/duplicate_submits.py --threads 16 --rounds 20
+
+Every round must leave exactly one pending request for the hospital and
+every submit must redirect rather than fail. Exits with status 1 otherwise.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EMAIL = 'duplicates@example.com'
+PASSWORD = 'correct horse battery staple'
+PINCODE = '560001'
+
+
+def setup(rounds):
+    from app import create_app, db
+    from app.models.user import User, DonorProfile, HospitalProfile
+    from app.utils.passwords import hash_password
+
+    # The testing profile turns off CSRF and the request rate limit
+    app = create_app('testing')
+    with app.app_context():
+        donor = User(email=EMAIL, password=hash_password(PASSWORD), role='donor')
+        donor.donor_profile = DonorProfile(name='Duplicate Tester', age=30, gender='female', blood_group='O+',
+                                           weight=60, phone='9000000000', address='Somewhere 1', pincode=PINCODE)
+        db.session.add(donor)
+        hospital_ids = []
+        for i in range(rounds * 2):
+            user = User(email=f'hospital{i}@example.com', password='!', role='hospital')
+            user.hospital_profile = HospitalProfile(name=f'Hospital {i}', license_number=f'DUP{i:04d}',
+                                                    phone='9000000001', address=f'{i} Main Road', pincode=PINCODE)
+            db.session.add(user)
+            db.session.flush()
+            hospital_ids.append(user.hospital_profile.id)
+        db.session.commit()
+        donor_id = donor.id
+    return app, donor_id, hospital_ids
+
+
+def submit_concurrently(clients, hospital_id, keys):
+    barrier = threading.Barrier(len(clients))
+    statuses = []
+
+    def submit(client, key):
+        barrier.wait()
+        response = client.post('/donor/donation/request', data={
+            'hospital_id': hospital_id, 'units': 1, 'idempotency_key': key
+        })
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=submit, args=(client, key)) for client, key in zip(clients, keys)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['TEST_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='duplicates-'), 'bench.db')
+    app, donor_id, hospital_ids = setup(args.rounds)
+
+    from app.models.donation import Donation
+
+    clients = []
+    for _ in range(args.threads):
+        client = app.test_client()
+        client.post('/auth/login', data={'email': EMAIL, 'password': PASSWORD})
+        clients.append(client)
+
+    failures = 0
+    for name, same_key in (('same key', True), ('distinct keys', False)):
+        wrong = errors = 0
+        for hospital_id in hospital_ids[:args.rounds] if same_key else hospital_ids[args.rounds:]:
+            shared = uuid.uuid4().hex
+            keys = [shared if same_key else uuid.uuid4().hex for _ in clients]
+            statuses = submit_concurrently(clients, hospital_id, keys)
+            errors += sum(1 for status in statuses if status != 302)
+            with app.app_context():
+                pending = Donation.query.filter_by(donor_id=donor_id, hospital_id=hospital_id, status='pending').count()
+            wrong += pending != 1
+        print(f"{name:>13}: {args.rounds} rounds of {args.threads} submits, "
+              f"{wrong} rounds without exactly one pending request, {errors} failed submits")
+        failures += wrong + errors
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
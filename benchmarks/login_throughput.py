@@ -0,0 +1,70 @@
+"""
+Logins per second per core at different bcrypt costs.
+
+For each cost one donor is stored with a hash of that cost, then the login
+form is posted through the Flask test client in a single process for --seconds.
+
+    python benchmarks/login_throughput.py --costs 10 11 12 13
+
+Pick the highest cost whose rate, times the cores serving logins, still
+covers the login peak. Set it with BCRYPT_LOG_ROUNDS; existing users are
+rehashed at the new cost on their next login.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'correct horse battery staple'
+
+
+def measure(app, cost, seconds):
+    from app import db, bcrypt
+    from app.models.user import User
+    from app.utils.passwords import hash_password, hash_cost
+
+    # The testing profile turns off CSRF and rate limiting, which would
+    # otherwise cap the logins measured here. Flask-Bcrypt reads the cost
+    # in init_app, so it is applied again after changing the config.
+    app.config['BCRYPT_LOG_ROUNDS'] = cost
+    bcrypt.init_app(app)
+    with app.app_context():
+        password_hash = hash_password(PASSWORD)
+        assert hash_cost(password_hash) == cost, hash_cost(password_hash)
+        User.query.filter_by(email=EMAIL).delete()
+        db.session.add(User(email=EMAIL, password=password_hash, role='donor'))
+        db.session.commit()
+
+    logins = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        client = app.test_client()
+        response = client.post('/auth/login', data={'email': EMAIL, 'password': PASSWORD})
+        if response.status_code != 302:
+            raise SystemExit(f"Login failed with status {response.status_code}")
+        logins += 1
+    return logins / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--costs', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    os.environ['TEST_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='login-bench-'), 'bench.db')
+    from app import create_app
+    app = create_app('testing')
+
+    print(f"{'cost':>4}  {'logins/s/core':>13}  {'ms/login':>8}")
+    for cost in args.costs:
+        rate = measure(app, cost, args.seconds)
+        print(f"{cost:>4}  {rate:>13.1f}  {1000 / rate:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
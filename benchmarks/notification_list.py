@@ -0,0 +1,119 @@
+"""
+Notification list latency before and after the per-user index and retention.
+
+Builds a throwaway SQLite database with --rows notifications spread over
+--users donors, then times the query behind the donor notifications page
+(count plus newest page) for a sample of users:
+
+  before: no (user_id, created_at) index, nothing archived
+  after:  index present and read notifications past retention archived
+
+    python benchmarks/notification_list.py --rows 10000000
+
+Building 10M rows takes a few minutes and a few GB of disk.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build(path, rows, users, days):
+    conn = sqlite3.connect(path)
+    conn.execute('DROP INDEX IF EXISTS ix_notification_user_created')
+    conn.executemany('INSERT INTO user (id, email, password, role) VALUES (?, ?, ?, ?)', (
+        (user_id, f'donor{user_id}@example.com', 'x', 'donor') for user_id in range(1, users + 1)
+    ))
+
+    now = datetime.utcnow()
+    rng = random.Random(42)
+
+    def generate():
+        for i in range(rows):
+            created = now - timedelta(seconds=rng.randrange(days * 86400))
+            # Older notifications are far more likely to have been read
+            is_read = rng.random() < (0.5 if created > now - timedelta(days=30) else 0.97)
+            yield (rng.randrange(1, users + 1), 'Reminder', 'You are eligible to donate again.',
+                   'donation_reminder', 'system', True, is_read, created)
+
+    batch = []
+    for row in generate():
+        batch.append(row)
+        if len(batch) == 100000:
+            conn.executemany(INSERT_NOTIFICATION, batch)
+            batch = []
+    conn.executemany(INSERT_NOTIFICATION, batch)
+    conn.commit()
+    conn.close()
+
+
+INSERT_NOTIFICATION = (
+    'INSERT INTO notification (user_id, title, message, notification_type, delivery_method, '
+    'is_sent, is_read, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+
+def time_list(path, user_ids, per_page=10):
+    conn = sqlite3.connect(path)
+    timings = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        conn.execute('SELECT COUNT(*) FROM notification WHERE user_id = ?', (user_id,)).fetchone()
+        conn.execute(
+            'SELECT * FROM notification WHERE user_id = ? ORDER BY created_at DESC LIMIT ? OFFSET 0',
+            (user_id, per_page)
+        ).fetchall()
+        timings.append(time.perf_counter() - start)
+    conn.close()
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=730, help='spread of created_at into the past')
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='notification-bench-')
+    path = os.path.join(workdir, 'bench.db')
+    os.environ['DATABASE_URI'] = f'sqlite:///{path}'
+
+    from app import create_app
+    app = create_app()
+
+    start = time.perf_counter()
+    build(path, args.rows, args.users, args.days)
+    print(f"Built {args.rows} notifications for {args.users} users in {time.perf_counter() - start:.1f}s")
+
+    sample = random.Random(7).sample(range(1, args.users + 1), min(args.samples, args.users))
+
+    median, p95 = time_list(path, sample)
+    print(f"before: median {median * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms")
+
+    conn = sqlite3.connect(path)
+    start = time.perf_counter()
+    conn.execute('CREATE INDEX ix_notification_user_created ON notification (user_id, created_at)')
+    conn.close()
+    print(f"Index built in {time.perf_counter() - start:.1f}s")
+
+    from app.utils.notifications import archive_read_notifications
+    with app.app_context():
+        start = time.perf_counter()
+        archived = archive_read_notifications()
+        print(f"Archived {archived} notifications in {time.perf_counter() - start:.1f}s")
+
+    median, p95 = time_list(path, sample)
+    print(f"after:  median {median * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+wrk-style load test of the public pages and a static file.
+
+Starts the app on a local threaded HTTP server and keeps --connections
+keep-alive connections busy for --seconds per scenario, with the page cache
+off and then on:
+
+    python benchmarks/public_pages.py --connections 8 --seconds 5
+
+Each connection is a new anonymous visitor without cookies, as crawlers and
+first-time visitors are. Reports requests per second and p50/p99 latency.
+Pass --url to load an already running server instead; it is then measured
+once, as configured.
+"""
+import argparse
+import http.client
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PATHS = ['/', '/about', '/contact']
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def load(host, port, paths, connections, seconds):
+    deadline = time.perf_counter() + seconds
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def connection():
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        mine, failed, i = [], 0, 0
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=10)
+                continue
+            mine.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=connection) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors)
+
+
+def report(name, latencies, errors, seconds):
+    print(f"{name:>28}: {len(latencies) / seconds:8.0f} req/s   p50 {percentile(latencies, 0.5) * 1000:6.2f} ms   "
+          f"p99 {percentile(latencies, 0.99) * 1000:6.2f} ms   {errors} errors")
+
+
+def serve():
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from app import create_app
+
+    os.environ['TEST_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='pages-'), 'bench.db')
+    app = create_app('testing')
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'  # keep connections alive, as wrk does
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--url', help='base URL of a running server')
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        latencies, errors = load(url.hostname, url.port or 80, PATHS, args.connections, args.seconds)
+        report('public pages', latencies, errors, args.seconds)
+        return
+
+    app, server = serve()
+    with app.test_request_context():
+        from flask import url_for
+        static_path = url_for('static', filename='css/main.css')
+
+    for name, ttl in (('public pages, no cache', 0), ('public pages, page cache', 300)):
+        app.config['PAGE_CACHE_SECONDS'] = ttl
+        app.extensions.pop('page_cache', None)
+        latencies, errors = load('127.0.0.1', server.server_port, PATHS, args.connections, args.seconds)
+        report(name, latencies, errors, args.seconds)
+
+    latencies, errors = load('127.0.0.1', server.server_port, [static_path], args.connections, args.seconds)
+    report('fingerprinted static file', latencies, errors, args.seconds)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
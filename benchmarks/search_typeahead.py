@@ -0,0 +1,93 @@
+"""
+Typeahead latency on a large donor table.
+
+Builds a throwaway SQLite database with --donors donors (names, emails and
+phones drawn from a few thousand syllable combinations), indexes them into
+the FTS5 search table, then times the admin typeahead lookup for prefixes
+of 2 to 8 characters as they would be typed:
+
+    python benchmarks/search_typeahead.py --donors 1000000 --max-ms 20
+
+Exits with status 1 if the p95 latency exceeds --max-ms.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SYLLABLES = ['ra', 'jes', 'an', 'ku', 'mar', 'pri', 'ya', 'sun', 'dar', 'vi', 'kram', 'neh', 'sha',
+             'ar', 'jun', 'me', 'ena', 'ro', 'hit', 'pa', 'tel', 'red', 'dy', 'iyer', 'na', 'ir']
+
+
+def name(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).title()
+
+
+def build(path, donors):
+    rng = random.Random(7)
+    conn = sqlite3.connect(path)
+    users, profiles = [], []
+    for user_id in range(1, donors + 1):
+        first, last = name(rng), name(rng)
+        users.append((user_id, f'{first.lower()}.{last.lower()}{user_id}@example.com', '!', 'donor'))
+        profiles.append((user_id, f'{first} {last}', 30, 'female', 'O+', 60.0,
+                         f'9{rng.randrange(10 ** 9):09d}', 'Somewhere 1', '560001'))
+    conn.executemany('INSERT INTO user (id, email, password, role) VALUES (?, ?, ?, ?)', users)
+    conn.executemany('INSERT INTO donor_profile (user_id, name, age, gender, blood_group, weight, phone, '
+                     'address, pincode) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', profiles)
+    conn.commit()
+    conn.close()
+    return [profile[1] for profile in rng.sample(profiles, 200)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--donors', type=int, default=1000000)
+    parser.add_argument('--max-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='search-bench-'), 'bench.db')
+    os.environ['DATABASE_URI'] = 'sqlite:///' + path
+    os.environ['AUTO_CREATE_TABLES'] = 'true'
+    os.environ['SCHEDULER_ENABLED'] = 'false'
+
+    from app import create_app, db
+    from app.utils.search import reindex, typeahead
+
+    app = create_app('production')
+
+    start = time.perf_counter()
+    names = build(path, args.donors)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            reindex(connection, 'donor')
+    print(f"Built and indexed {args.donors} donors in {time.perf_counter() - start:.0f}s")
+
+    # Each sampled name typed one character at a time, from two characters
+    queries = [full_name[:length] for full_name in names for length in range(2, min(len(full_name), 8) + 1)]
+    timings = []
+    with app.app_context():
+        typeahead('donor', 'warm up')
+        for query in queries:
+            start = time.perf_counter()
+            results = typeahead('donor', query)
+            timings.append((time.perf_counter() - start) * 1000)
+            if len(query) > 4 and not results:
+                raise SystemExit(f"No results for {query!r}")
+
+    timings.sort()
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"{len(queries)} lookups: p50 {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms, max {timings[-1]:.2f} ms")
+    if p95 > args.max_ms:
+        print(f"p95 is over {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Cold-start time of create_app, measured in fresh interpreters.
+
+    python benchmarks/startup.py --runs 10 --max-seconds 1.5
+
+Each run starts a new Python process, imports the app and calls create_app
+with AUTO_CREATE_TABLES=false, as production workers do. The slowest imports
+are listed from one `python -X importtime` run. With --max-seconds the script
+exits with status 1 when the median start time exceeds the bound, so it can
+gate CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+START_APP = (
+    'import time; started = time.perf_counter(); '
+    'from app import create_app; create_app(); '
+    'print(time.perf_counter() - started)'
+)
+
+
+def environment():
+    env = dict(os.environ)
+    env['AUTO_CREATE_TABLES'] = 'false'
+    env['SCHEDULER_ENABLED'] = 'false'
+    env.setdefault('DATABASE_URI', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='startup-bench-'), 'bench.db'))
+    return env
+
+
+def cold_start(env):
+    output = subprocess.run([sys.executable, '-c', START_APP], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(env, count):
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', START_APP], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Top-level imports and what they pulled in directly, which under
+        # the app package are the libraries worth making lazy
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            imports.append((int(cumulative_us), name[1:].rstrip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to list')
+    parser.add_argument('--max-seconds', type=float, help='fail if the median start time is above this')
+    args = parser.parse_args()
+
+    env = environment()
+    cold_start(env)  # Warm the filesystem cache and bytecode
+
+    timings = [cold_start(env) for _ in range(args.runs)]
+    median = statistics.median(timings)
+    print(f"create_app cold start over {args.runs} runs: median {median * 1000:.0f} ms, "
+          f"min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms")
+
+    print("\nSlowest imports, cumulative, indented by depth:")
+    for cumulative_us, name in slowest_imports(env, args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"\nFAIL: median {median:.3f}s is above the {args.max_seconds:.3f}s bound")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
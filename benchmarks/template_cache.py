@@ -0,0 +1,117 @@
+"""
+First-request latency of template-heavy pages in a freshly started worker.
+
+Each run starts a new Python process, as a worker added on scale-out is,
+signs in and times the first and second GET of each page, with:
+
+    none         no bytecode cache: every template is compiled on first use
+    cold         an empty TEMPLATE_CACHE_DIR: compiled, then written to it
+    precompiled  a cache filled by `flask precompile-templates` at deploy
+
+    python benchmarks/template_cache.py --runs 5
+
+The second request shows the cost of a page once its templates are loaded.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'correct horse battery staple'
+PAGES = [
+    ('hospital@example.com', '/hospital/dashboard'),
+    ('hospital@example.com', '/hospital/inventory'),
+    ('donor@example.com', '/donor/dashboard'),
+    ('donor@example.com', '/donor/donation/history'),
+]
+
+WORKER = '''
+import json, sys, time
+from app import create_app
+app = create_app('testing')
+timings = {}
+for email, path in json.loads(sys.argv[1]):
+    client = app.test_client()
+    client.post('/auth/login', data={'email': email, 'password': sys.argv[2]})
+    for attempt in ('first', 'second'):
+        started = time.perf_counter()
+        status = client.get(path).status_code
+        timings[f'{path} {attempt}'] = time.perf_counter() - started
+        assert status == 200, (path, status)
+print(json.dumps(timings))
+'''
+
+
+def setup(directory):
+    from app import create_app, db
+    from app.models.user import User, DonorProfile, HospitalProfile
+    from app.models.donation import BloodInventory
+    from app.utils.passwords import hash_password
+
+    os.environ['TEST_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, 'bench.db')
+    os.environ['TEMPLATE_CACHE_DIR'] = ''
+    app = create_app('testing')
+    with app.app_context():
+        password = hash_password(PASSWORD)
+        donor = User(email='donor@example.com', password=password, role='donor')
+        donor.donor_profile = DonorProfile(name='Template Tester', age=30, gender='female', blood_group='O+',
+                                           weight=60, phone='9000000000', address='Somewhere 1', pincode='560001')
+        hospital = User(email='hospital@example.com', password=password, role='hospital')
+        hospital.hospital_profile = HospitalProfile(name='Template Hospital', license_number='TPL0001',
+                                                    phone='9000000001', address='1 Main Road', pincode='560001')
+        hospital.hospital_profile.blood_inventory = [
+            BloodInventory(blood_group=group, units=10) for group in ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+        ]
+        db.session.add_all([donor, hospital])
+        db.session.commit()
+
+
+def run_worker(env):
+    output = subprocess.run([sys.executable, '-c', WORKER, json.dumps(PAGES), PASSWORD], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='template-bench-')
+    setup(directory)
+    env = dict(os.environ, SCHEDULER_ENABLED='false')
+
+    precompiled = os.path.join(directory, 'precompiled')
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', 'precompile-templates'], cwd=ROOT,
+                   env=dict(env, TEMPLATE_CACHE_DIR=precompiled, FLASK_CONFIG='testing'),
+                   capture_output=True, check=True)
+
+    results = {}
+    for mode in ('none', 'cold', 'precompiled'):
+        runs = []
+        for run in range(args.runs):
+            if mode == 'none':
+                cache = ''
+            elif mode == 'cold':
+                cache = os.path.join(directory, f'cold{run}')
+            else:
+                cache = precompiled
+            runs.append(run_worker(dict(env, TEMPLATE_CACHE_DIR=cache)))
+        results[mode] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+    print(f"Median of {args.runs} fresh workers, ms:")
+    print(f"{'request':>32} " + ''.join(f"{mode:>13}" for mode in results))
+    for key in results['none']:
+        print(f"{key:>32} " + ''.join(f"{results[mode][key] * 1000:13.1f}" for mode in results))
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
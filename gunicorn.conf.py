@@ -0,0 +1,15 @@
+# Gunicorn settings for production: gunicorn -c gunicorn.conf.py run:app
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+# Server-Sent Events streams stay open while the browser tab is, so use
+# cooperative gevent workers that can each hold thousands of idle connections
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 10000))
+
+# Streams send a keep-alive or fresh counts every 15 seconds, well inside these limits
+timeout = 60
+keepalive = 75
@@ -0,0 +1,48 @@
+"""Add inventory snapshot and shortage forecast tables
+
+Revision ID: 3c6f1d2a8b47
+Revises: 917b8325cb52
+Create Date: 2026-10-19 09:12:41.204318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c6f1d2a8b47'
+down_revision = '917b8325cb52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inventory_snapshot',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hospital_id', sa.Integer(), nullable=False),
+        sa.Column('blood_group', sa.String(length=5), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('taken_on', sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(['hospital_id'], ['hospital_profile.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('hospital_id', 'blood_group', 'taken_on', name='unique_inventory_snapshot')
+    )
+    op.create_table('shortage_forecast',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hospital_id', sa.Integer(), nullable=False),
+        sa.Column('blood_group', sa.String(length=5), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('donation_rate', sa.Float(), nullable=False),
+        sa.Column('consumption_rate', sa.Float(), nullable=False),
+        sa.Column('days_of_supply', sa.Float(), nullable=True),
+        sa.Column('computed_at', sa.DateTime(), nullable=True),
+        sa.Column('last_alert_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['hospital_id'], ['hospital_profile.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('hospital_id', 'blood_group', name='unique_shortage_forecast')
+    )
+
+
+def downgrade():
+    op.drop_table('shortage_forecast')
+    op.drop_table('inventory_snapshot')
@@ -0,0 +1,45 @@
+"""Add badge counters for unread notifications and pending donations
+
+Revision ID: 4a7e2c9d1f35
+Revises: b5d90e3f6c12
+Create Date: 2026-10-19 15:21:08.661930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a7e2c9d1f35'
+down_revision = 'b5d90e3f6c12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('badge_counter',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('owner_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name', 'owner_id')
+    )
+
+    # Backfill from existing rows
+    op.execute("""
+        INSERT INTO badge_counter (name, owner_id, value)
+        SELECT 'unread_notifications', user_id, COUNT(*)
+        FROM notification
+        WHERE is_read IS NULL OR NOT is_read
+        GROUP BY user_id
+    """)
+    op.execute("""
+        INSERT INTO badge_counter (name, owner_id, value)
+        SELECT 'pending_donations', hospital_id, COUNT(*)
+        FROM donation
+        WHERE status = 'pending' AND hospital_id IS NOT NULL
+        GROUP BY hospital_id
+    """)
+
+
+def downgrade():
+    op.drop_table('badge_counter')
@@ -0,0 +1,50 @@
+"""Add notification archive and per-user notification index
+
+Revision ID: 6d3b8f0e2a14
+Revises: 4a7e2c9d1f35
+Create Date: 2026-10-19 17:12:40.228713
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d3b8f0e2a14'
+down_revision = '4a7e2c9d1f35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('notification_type', sa.String(length=50), nullable=False),
+        sa.Column('delivery_method', sa.String(length=20), nullable=False),
+        sa.Column('is_sent', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('related_entity_type', sa.String(length=50), nullable=True),
+        sa.Column('related_entity_id', sa.Integer(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_archive_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_user_created', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_user_created')
+
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_archive_user_id'))
+
+    op.drop_table('notification_archive')
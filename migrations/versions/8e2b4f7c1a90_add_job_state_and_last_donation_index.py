@@ -0,0 +1,36 @@
+"""Add job state table and index donor last donation date
+
+Revision ID: 8e2b4f7c1a90
+Revises: 3c6f1d2a8b47
+Create Date: 2026-10-19 11:02:17.583902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2b4f7c1a90'
+down_revision = '3c6f1d2a8b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_state',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('watermark', sa.DateTime(), nullable=True),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+    with op.batch_alter_table('donor_profile', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_donor_profile_last_donation_date'), ['last_donation_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('donor_profile', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_donor_profile_last_donation_date'))
+
+    op.drop_table('job_state')
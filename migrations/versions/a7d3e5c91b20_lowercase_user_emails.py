@@ -0,0 +1,36 @@
+"""Store user emails lowercased
+
+Revision ID: a7d3e5c91b20
+Revises: f2c6d81a9e40
+Create Date: 2026-10-19 20:12:37.114902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5c91b20'
+down_revision = 'f2c6d81a9e40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Logins look emails up lowercased. Accounts whose lowercased email is
+    # shared with another account are left as they are; `flask email-collisions`
+    # lists them and lets an admin pick the one that keeps the email.
+    op.execute("""
+        UPDATE "user"
+        SET email = LOWER(TRIM(email))
+        WHERE email != LOWER(TRIM(email)) AND LOWER(TRIM(email)) IN (
+            SELECT normalized FROM (
+                SELECT LOWER(TRIM(email)) AS normalized FROM "user" GROUP BY LOWER(TRIM(email)) HAVING COUNT(*) = 1
+            ) AS unique_emails
+        )
+    """)
+
+
+def downgrade():
+    # The original case is not kept
+    pass
@@ -0,0 +1,34 @@
+"""Add run metrics to job state
+
+Revision ID: b5d90e3f6c12
+Revises: 8e2b4f7c1a90
+Create Date: 2026-10-19 13:40:55.917264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d90e3f6c12'
+down_revision = '8e2b4f7c1a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job_state', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('run_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('failure_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('total_duration', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_duration', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('last_error', sa.String(length=200), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('job_state', schema=None) as batch_op:
+        batch_op.drop_column('last_error')
+        batch_op.drop_column('last_duration')
+        batch_op.drop_column('total_duration')
+        batch_op.drop_column('failure_count')
+        batch_op.drop_column('run_count')
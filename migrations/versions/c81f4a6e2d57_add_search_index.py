@@ -0,0 +1,63 @@
+"""Add full-text search tables and profile user_id indexes
+
+Revision ID: c81f4a6e2d57
+Revises: 6d3b8f0e2a14
+Create Date: 2026-10-19 17:24:05.613920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f4a6e2d57'
+down_revision = '6d3b8f0e2a14'
+branch_labels = None
+depends_on = None
+
+SQLITE_TABLE = "CREATE VIRTUAL TABLE {name} USING fts5(body{extra}, " \
+               "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+
+POSTGRES_TABLE = "CREATE TABLE {name} (rowid integer PRIMARY KEY, body text NOT NULL{extra}, " \
+                 "document tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED)"
+
+BACKFILL = {
+    'donor_search': "INSERT INTO donor_search (rowid, body) "
+                    "SELECT u.id, p.name || ' ' || u.email || ' ' || p.phone "
+                    "FROM \"user\" u JOIN donor_profile p ON p.user_id = u.id",
+    'hospital_search': "INSERT INTO hospital_search (rowid, body) "
+                       "SELECT id, name || ' ' || address FROM hospital_profile",
+    'donation_search': "INSERT INTO donation_search (rowid, body, hospital_id) "
+                       "SELECT id, notes, hospital_id FROM donation WHERE notes IS NOT NULL AND notes <> ''",
+}
+
+
+def upgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for name in BACKFILL:
+        if sqlite:
+            extra = ', hospital_id UNINDEXED' if name == 'donation_search' else ''
+            op.execute(SQLITE_TABLE.format(name=name, extra=extra))
+        else:
+            extra = ', hospital_id integer' if name == 'donation_search' else ''
+            op.execute(POSTGRES_TABLE.format(name=name, extra=extra))
+            op.execute(f"CREATE INDEX ix_{name}_document ON {name} USING gin (document)")
+        op.execute(BACKFILL[name])
+
+    # Search results, and every request's profile load, look profiles up by user
+    with op.batch_alter_table('donor_profile', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_donor_profile_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('hospital_profile', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_hospital_profile_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('hospital_profile', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_hospital_profile_user_id'))
+
+    with op.batch_alter_table('donor_profile', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_donor_profile_user_id'))
+
+    for name in BACKFILL:
+        op.execute(f"DROP TABLE {name}")
@@ -0,0 +1,44 @@
+"""Add donor summaries for dashboard totals
+
+Revision ID: e4a9c27b5d18
+Revises: c81f4a6e2d57
+Create Date: 2026-10-19 18:02:47.315206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c27b5d18'
+down_revision = 'c81f4a6e2d57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('donor_summary',
+        sa.Column('donor_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('total_donations', sa.Integer(), nullable=False),
+        sa.Column('completed_count', sa.Integer(), nullable=False),
+        sa.Column('total_units', sa.Integer(), nullable=False),
+        sa.Column('last_donation_date', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('donor_id')
+    )
+
+    # Backfill every donor from existing rows
+    op.execute("""
+        INSERT INTO donor_summary (donor_id, total_donations, completed_count, total_units, last_donation_date)
+        SELECT p.user_id,
+               COUNT(d.id),
+               COALESCE(SUM(CASE WHEN d.status = 'completed' THEN 1 ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN d.status = 'completed' THEN d.units ELSE 0 END), 0),
+               p.last_donation_date
+        FROM donor_profile p
+        LEFT JOIN donation d ON d.donor_id = p.user_id
+        GROUP BY p.user_id, p.last_donation_date
+    """)
+
+
+def downgrade():
+    op.drop_table('donor_summary')
@@ -0,0 +1,48 @@
+"""Add idempotency keys and one pending request per donor and hospital
+
+Revision ID: f2c6d81a9e40
+Revises: e4a9c27b5d18
+Create Date: 2026-10-19 18:41:12.508934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6d81a9e40'
+down_revision = 'e4a9c27b5d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('donation', sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+
+    # Keep the oldest of any duplicate pending requests and cancel the rest.
+    # Requests without a hospital are not covered by the unique index (NULLs
+    # differ), so they are left alone rather than grouped together.
+    op.execute("""
+        UPDATE donation
+        SET status = 'cancelled', cancellation_date = CURRENT_TIMESTAMP
+        WHERE status = 'pending' AND hospital_id IS NOT NULL AND id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id FROM donation
+                WHERE status = 'pending' AND hospital_id IS NOT NULL
+                GROUP BY donor_id, hospital_id
+            ) AS oldest
+        )
+    """)
+    # Pending badges are reseeded from a recount on their next read
+    op.execute("DELETE FROM badge_counter WHERE name = 'pending_donations'")
+
+    op.create_index('uq_donation_pending_donor_hospital', 'donation', ['donor_id', 'hospital_id'], unique=True,
+                    sqlite_where=sa.text("status = 'pending'"), postgresql_where=sa.text("status = 'pending'"))
+    op.create_index('uq_donation_donor_idempotency_key', 'donation', ['donor_id', 'idempotency_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_donation_donor_idempotency_key', table_name='donation')
+    op.drop_index('uq_donation_pending_donor_hospital', table_name='donation')
+    with op.batch_alter_table('donation') as batch_op:
+        batch_op.drop_column('idempotency_key')
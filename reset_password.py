@@ -1,5 +1,6 @@
-from app import create_app, db, bcrypt
+from app import create_app, db
 from app.models.user import User
+from app.utils.passwords import hash_password
 
 def reset_user_password():
     app = create_app()
@@ -11,7 +12,7 @@ def reset_user_password():
             
             # Set a new password
             new_password = 'password123'  # Simple password for testing
-            hashed_password = bcrypt.generate_password_hash(new_password).decode('utf-8')
+            hashed_password = hash_password(new_password)
             user.password = hashed_password
             
             # Commit the changes